@@ -1,22 +1,47 @@
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+import time
 import uvicorn
-import sys
-from pathlib import Path
-
-# Add parent directory to path so we can import our modules
-sys.path.append(str(Path(__file__).resolve().parent))
+from dotenv import load_dotenv
 
 # Import the recommender
-from main import SHLRecommender
+from main import SHLRecommender, PageTooLargeError
+
+logger = logging.getLogger(__name__)
+
+# Recommender instance, created once per worker at startup
+recommender: Optional[SHLRecommender] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize and warm up the recommender when the worker starts"""
+    global recommender
+    # Load environment variables
+    load_dotenv()
+    recommender = await asyncio.to_thread(SHLRecommender)
+    
+    # Prime the embedding client and Qdrant connection so the first request doesn't pay for it
+    try:
+        await asyncio.to_thread(recommender.recommend, "warmup", 1)
+    except Exception as e:
+        logger.warning("Recommender warmup failed: %s", e)
+    
+    yield
 
 # Initialize the app
 app = FastAPI(
     title="SHL Assessment Recommender API",
     description="API for recommending SHL assessments based on job descriptions",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware to allow cross-origin requests
@@ -28,22 +53,31 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Initialize recommender
-recommender = SHLRecommender()
+# Per-request timing is opt-in so the default request path only runs CORS
+if os.environ.get("ENABLE_METRICS"):
+    @app.middleware("http")
+    async def add_process_time_header(request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        response.headers["X-Process-Time"] = f"{time.perf_counter() - start:.4f}"
+        return response
 
-# Simple model for the required endpoint
-class SimpleQueryModel(BaseModel):
-    query: str
-
-# Full model with all options
+# Query model; only query is required, so {"query": "..."} is accepted as is
 class FullQueryModel(BaseModel):
     query: str
     top_k: Optional[int] = 10
     enhanced: Optional[bool] = False
     filters: Optional[Dict[str, Any]] = None
 
-@app.post("/recommend", response_model=List[Dict[str, Any]])
-async def recommend(request: Union[SimpleQueryModel, FullQueryModel]):
+# Batch model for several queries sharing the same options
+class BatchQueryModel(BaseModel):
+    queries: List[str]
+    top_k: Optional[int] = 10
+    enhanced: Optional[bool] = False
+    filters: Optional[Dict[str, Any]] = None
+
+@app.post("/recommend")
+async def recommend(request: FullQueryModel):
     """
     Get SHL assessment recommendations based on a text query
     
@@ -54,22 +88,18 @@ async def recommend(request: Union[SimpleQueryModel, FullQueryModel]):
         List of assessment recommendations
     """
     try:
-        # Check if the request has the additional attributes
-        top_k = getattr(request, "top_k", 10)
-        enhanced = getattr(request, "enhanced", False)
-        filters = getattr(request, "filters", None)
-        
-        results = recommender.recommend(
-            query=request.query,
-            top_k=top_k,
-            enhanced=enhanced,
-            filters=filters
+        results = await asyncio.to_thread(
+            recommender.recommend,
+            request.query,
+            request.top_k,
+            request.enhanced,
+            request.filters
         )
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/recommend", response_model=List[Dict[str, Any]])
+@app.get("/recommend")
 async def recommend_get(
     query: str = Query(..., description="Job description or requirements"),
     top_k: int = Query(5, description="Number of recommendations to return"),
@@ -87,10 +117,34 @@ async def recommend_get(
         List of assessment recommendations
     """
     try:
-        results = recommender.recommend(
-            query=query,
-            top_k=top_k,
-            enhanced=enhanced
+        results = await asyncio.to_thread(
+            recommender.recommend,
+            query,
+            top_k,
+            enhanced
+        )
+        return results
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/recommend/batch")
+async def recommend_batch(request: BatchQueryModel):
+    """
+    Get SHL assessment recommendations for several text queries at once
+    
+    Args:
+        request: BatchQueryModel containing the queries and shared options
+    
+    Returns:
+        List of assessment recommendations for each query, in input order
+    """
+    try:
+        results = await asyncio.to_thread(
+            recommender.batch_recommend,
+            request.queries,
+            request.top_k,
+            request.enhanced,
+            request.filters
         )
         return results
     except Exception as e:
@@ -107,7 +161,7 @@ async def health_check():
     """
     return {"status": "healthy"}
 
-@app.post("/recommend-from-url", response_model=List[Dict[str, Any]])
+@app.post("/recommend-from-url")
 async def recommend_from_url(request: dict):
     """
     Get SHL assessment recommendations based on a job description URL
@@ -127,13 +181,15 @@ async def recommend_from_url(request: dict):
         enhanced = request.get("enhanced", False)
         filters = request.get("filters")
         
-        results = recommender.recommend_from_url(
+        results = await recommender.arecommend_from_url(
             url=url,
             top_k=top_k,
             enhanced=enhanced,
             filters=filters
         )
         return results
+    except PageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -143,10 +199,25 @@ async def root():
         "message": "Welcome to the SHL Assessment Recommender API",
         "endpoints": {
             "/recommend": "POST or GET to get recommendations based on text",
+            "/recommend/batch": "POST to get recommendations for several queries at once",
             "/recommend-from-url": "POST to get recommendations based on a URL",
             "/health": "GET to check API health status"
         }
     }
 
 if __name__ == "__main__":
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    dev_mode = bool(os.environ.get("DEV"))
+    # reload is incompatible with multiple workers, so only use it in development.
+    # Local Qdrant storage (qdrant_data/) is locked by the first process that opens
+    # it, so extra workers are only started when a Qdrant server is configured.
+    remote_qdrant = "QDRANT_URL" in os.environ and "QDRANT_API_KEY" in os.environ
+    workers = max(1, (os.cpu_count() or 1) // 2) if remote_qdrant and not dev_mode else 1
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        reload=dev_mode,
+        workers=workers
+    ) 
\ No newline at end of file
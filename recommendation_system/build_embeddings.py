@@ -1,56 +1,120 @@
 import os
 import argparse
+import asyncio
 from utils.data_processor import prepare_assessment_data, create_assessment_payloads
-from utils.vectorize import batch_get_embeddings
+from utils.vectorize import abatch_get_embeddings, batch_api_get_embeddings, content_hash
 from utils.vector_store import QdrantVectorStore
 from dotenv import load_dotenv
+from tqdm import tqdm
 
-# Load environment variables
-load_dotenv()
+# Number of assessments embedded and uploaded per chunk
+EMBEDDING_CHUNK_SIZE = 1024
+# Number of points per Qdrant upsert request
+UPSERT_BATCH_SIZE = 256
 
-def build_embeddings(data_file, collection_name):
+async def _embed_and_upload(df, vector_store):
+    """
+    Embed and upload assessments chunk by chunk within a single event loop
+    
+    Args:
+        df: Prepared assessment DataFrame
+        vector_store: Vector store to add the embeddings to
+        
+    Returns:
+        Number of vectors added
+    """
+    order = df['combined_text'].str.len().sort_values(kind='stable').index
+    num_added = 0
+    for start in tqdm(range(0, len(order), EMBEDDING_CHUNK_SIZE), desc="Building embeddings"):
+        chunk = df.loc[order[start:start + EMBEDDING_CHUNK_SIZE]]
+        embeddings = await abatch_get_embeddings(chunk['combined_text'].to_list())
+        payloads = create_assessment_payloads(chunk)
+        # Only the final chunk waits for Qdrant to apply the upserts
+        is_last_chunk = start + EMBEDDING_CHUNK_SIZE >= len(order)
+        vector_store.add_vectors(embeddings, payloads, ids=chunk.index.to_list(),
+                                 batch_size=UPSERT_BATCH_SIZE, wait=is_last_chunk)
+        num_added += len(embeddings)
+    return num_added
+
+def build_embeddings(data_file, collection_name, use_batch_api=False, progress_callback=None,
+                     recreate_collection=False):
     """
     Build and store assessment embeddings
     
     Args:
         data_file: Path to the CSV file containing assessment data
         collection_name: Name of the vector collection to create
+        use_batch_api: Embed through the OpenAI Batch API (half the cost, but slower to complete)
+        progress_callback: Optional function called as (status, completed, total) while
+            waiting for the Batch API job
+        recreate_collection: Delete and recreate the collection if its vector size doesn't
+            match the embedding model (all stored vectors are lost)
     """
     # Prepare assessment data
     print(f"Loading and processing assessment data from {data_file}...")
     df = prepare_assessment_data(data_file)
     print(f"Loaded {len(df)} assessments")
     
-    # Create embeddings for the assessments
-    print("Generating embeddings (this may take a while)...")
-    embeddings = batch_get_embeddings(df['combined_text'].tolist())
-    print(f"Generated {len(embeddings)} embeddings")
-    
-    # Create assessment payloads
-    print("Creating assessment payloads...")
-    payloads = create_assessment_payloads(df)
+    # Fingerprint the embedded text, model and vector size so unchanged
+    # assessments can skip re-embedding
+    df['content_hash'] = [content_hash(text) for text in df['combined_text']]
     
     # Initialize vector store
     print(f"Initializing vector store '{collection_name}'...")
-    vector_store = QdrantVectorStore(collection_name=collection_name)
+    vector_store = QdrantVectorStore(collection_name=collection_name,
+                                     recreate_on_mismatch=recreate_collection)
     
-    # Add vectors to the store
-    print("Adding vectors to the store...")
-    vector_store.add_vectors(embeddings, payloads)
+    # Rows whose text hash matches the stored point keep their vector; only
+    # their payloads are refreshed, and just the new or changed rows are embedded
+    stored_hashes = df.index.map(vector_store.get_content_hashes().get)
+    unchanged = df['content_hash'].to_numpy() == stored_hashes.to_numpy()
+    if unchanged.any():
+        print(f"{unchanged.sum()} assessments unchanged; updating their payloads only")
+        unchanged_df = df[unchanged]
+        vector_store.overwrite_payloads(create_assessment_payloads(unchanged_df),
+                                        ids=unchanged_df.index.to_list(), batch_size=UPSERT_BATCH_SIZE)
+        df = df[~unchanged]
+    
+    if df.empty:
+        num_added = 0
+    elif use_batch_api:
+        # Submit every text as one batch job, then upload all vectors together
+        print("Submitting embedding batch job (this may take a while)...")
+        embeddings = batch_api_get_embeddings(df['combined_text'].to_list(),
+                                              progress_callback=progress_callback)
+        vector_store.bulk_load(embeddings, create_assessment_payloads(df), ids=df.index.to_list(),
+                               batch_size=UPSERT_BATCH_SIZE)
+        num_added = len(embeddings)
+    else:
+        # Embed, build payloads and upload one chunk at a time so memory stays O(chunk).
+        # Rows are processed shortest-first so each batch holds texts of similar length.
+        print("Generating embeddings and adding vectors to the store (this may take a while)...")
+        # The HNSW index is built once at the end rather than while points stream in
+        with vector_store.indexing_paused():
+            num_added = asyncio.run(_embed_and_upload(df, vector_store))
+    print(f"Added {num_added} embeddings")
     
     print("Embedding build process completed successfully!")
     return vector_store
 
 def main():
+    # Load environment variables
+    load_dotenv()
+    
     parser = argparse.ArgumentParser(description="Build SHL assessment embeddings")
     parser.add_argument("--data-file", type=str, default="data/shl_assessments_first_row.csv",
                       help="Path to the CSV file containing assessment data")
     parser.add_argument("--collection-name", type=str, default="shl_assessments",
                       help="Name of the vector collection to create")
+    parser.add_argument("--batch-api", action="store_true",
+                      help="Embed through the OpenAI Batch API (half the cost, but slower to complete)")
+    parser.add_argument("--recreate-collection", action="store_true",
+                      help="Delete and recreate the collection if its vector size doesn't match the model")
     
     args = parser.parse_args()
     
-    build_embeddings(args.data_file, args.collection_name)
+    build_embeddings(args.data_file, args.collection_name, use_batch_api=args.batch_api,
+                     recreate_collection=args.recreate_collection)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,17 +1,18 @@
 import json
 import os
 import argparse
+import asyncio
 import numpy as np
 from typing import List, Dict, Any, Union
 from tqdm import tqdm
-from pathlib import Path
-
-# Add parent directory to path so we can import our modules
-import sys
-sys.path.append(str(Path(__file__).resolve().parent))
 
 from utils.vector_store import QdrantVectorStore
+from utils.vectorize import batch_get_embeddings
 from models.recommender import BaseRecommender
+from utils.metrics_numba import map_at_k
+
+# Number of queries sent to Qdrant per batched search request
+SEARCH_BATCH_SIZE = 64
 
 def load_test_queries(file_path: str) -> List[Dict[str, Any]]:
     """
@@ -27,63 +28,59 @@ def load_test_queries(file_path: str) -> List[Dict[str, Any]]:
         queries = json.load(f)
     return queries
 
-def calculate_recall_at_k(relevant: List[str], retrieved: List[Dict[str, Any]], k: int) -> float:
+def get_hits_at_k(relevant: List[str], retrieved: List[Dict[str, Any]], k: int) -> np.ndarray:
     """
-    Calculate Recall@K
+    Mark which of the top K retrieved assessments are relevant
     
     Args:
         relevant: List of relevant assessment names
         retrieved: List of retrieved assessment dictionaries
-        k: The K value for Recall@K
+        k: The K value for the metrics
+        
+    Returns:
+        int8 array with 1 at the first rank of each relevant assessment in the top K
+    """
+    # The catalogue repeats some names, so only the first occurrence of a
+    # relevant name counts; later duplicates would inflate recall and precision
+    relevant_names = set(relevant)
+    seen = set()
+    hits = np.zeros(min(len(retrieved), k), dtype=np.int8)
+    for i, item in enumerate(retrieved[:k]):
+        name = item['name']
+        if name in relevant_names and name not in seen:
+            seen.add(name)
+            hits[i] = 1
+    return hits
+
+def calculate_recall_at_k(hits: np.ndarray, num_relevant: int) -> float:
+    """
+    Calculate Recall@K
+    
+    Args:
+        hits: Hit array from get_hits_at_k
+        num_relevant: Number of relevant assessments
         
     Returns:
         Recall@K score
     """
-    if not relevant:
+    if num_relevant == 0:
         return 0.0
     
-    # Get names of retrieved assessments
-    retrieved_names = [item['name'] for item in retrieved[:k]]
-    
-    # Count relevant items found
-    found = sum(1 for name in relevant if name in retrieved_names)
-    
-    # Calculate recall
-    return found / len(relevant)
+    return float(hits.sum()) / num_relevant
 
-def calculate_map_at_k(relevant: List[str], retrieved: List[Dict[str, Any]], k: int) -> float:
+def calculate_map_at_k(hits: np.ndarray, num_relevant: int, k: int) -> float:
     """
     Calculate Mean Average Precision at K (MAP@K)
     
     Args:
-        relevant: List of relevant assessment names
-        retrieved: List of retrieved assessment dictionaries
+        hits: Hit array from get_hits_at_k
+        num_relevant: Number of relevant assessments
         k: The K value for MAP@K
         
     Returns:
         MAP@K score
     """
-    if not relevant:
-        return 0.0
-    
-    # Get names of retrieved assessments
-    retrieved_names = [item['name'] for item in retrieved[:k]]
-    
-    # Calculate precision at each relevant item
-    precision_sum = 0.0
-    num_hits = 0
-    
-    for i, name in enumerate(retrieved_names):
-        if name in relevant:
-            num_hits += 1
-            precision_at_i = num_hits / (i + 1)
-            precision_sum += precision_at_i
-    
-    # Calculate average precision
-    if num_hits == 0:
-        return 0.0
-    
-    return precision_sum / min(len(relevant), k)
+    return float(map_at_k(hits, num_relevant, k))
 
 def evaluate_recommender(recommender: BaseRecommender, test_queries: List[Dict[str, Any]], 
                         k: int = 10, use_enhanced: bool = False) -> Dict[str, Any]:
@@ -108,19 +105,34 @@ def evaluate_recommender(recommender: BaseRecommender, test_queries: List[Dict[s
     recall_scores = []
     map_scores = []
     
-    for query_data in tqdm(test_queries, desc="Evaluating queries"):
+    queries = [query_data['query'] for query_data in test_queries]
+    
+    # Rewrite the queries with concurrent GPT requests first if requested
+    if use_enhanced:
+        search_texts = asyncio.run(recommender._enhance_many(queries))
+    else:
+        search_texts = queries
+    
+    # Embed all queries in batched calls (batch_get_embeddings dedupes and length-sorts them)
+    vectors = batch_get_embeddings(search_texts)
+    
+    # Search in batches, one Qdrant round-trip per SEARCH_BATCH_SIZE queries
+    all_recommendations = []
+    for start in range(0, len(search_texts), SEARCH_BATCH_SIZE):
+        end = start + SEARCH_BATCH_SIZE
+        all_recommendations.extend(
+            recommender.process_queries(search_texts[start:end], limit=k, query_vectors=vectors[start:end])
+        )
+    
+    for query_data, recommendations in tqdm(zip(test_queries, all_recommendations),
+                                            total=len(test_queries), desc="Evaluating queries"):
         query = query_data['query']
         relevant_assessments = query_data['relevant_assessments']
         
-        # Get recommendations
-        if use_enhanced:
-            recommendations = recommender.enhanced_recommendations(query, limit=k)
-        else:
-            recommendations = recommender.process_query(query, limit=k)
-        
-        # Calculate metrics
-        recall = calculate_recall_at_k(relevant_assessments, recommendations, k)
-        map_score = calculate_map_at_k(relevant_assessments, recommendations, k)
+        # Calculate metrics from a shared hit array
+        hits = get_hits_at_k(relevant_assessments, recommendations, k)
+        recall = calculate_recall_at_k(hits, len(relevant_assessments))
+        map_score = calculate_map_at_k(hits, len(relevant_assessments), k)
         
         # Save individual query results
         query_result = {
@@ -157,9 +169,9 @@ def main():
     
     args = parser.parse_args()
     
-    # Initialize vector store and recommender
+    # Initialize vector store and recommender; caching would blur per-query metrics
     vector_store = QdrantVectorStore(collection_name=args.collection_name)
-    recommender = BaseRecommender(vector_store=vector_store)
+    recommender = BaseRecommender(vector_store=vector_store, semantic_cache=False)
     
     # Load test queries
     test_queries = load_test_queries(args.queries_file)
@@ -1,26 +1,45 @@
 import os
 import argparse
+import asyncio
 import json
+import logging
+import threading
+import httpx
 import requests
-from typing import Dict, List, Optional, Union, Any
+from cachetools import TTLCache
+from selectolax.lexbor import LexborHTMLParser
+from typing import Dict, List, Optional, Tuple, Union, Any
 from dotenv import load_dotenv
-from utils.data_processor import prepare_assessment_data, create_assessment_payloads
-from utils.vectorize import batch_get_embeddings, get_embedding
+from utils.vectorize import get_embeddings_batch, get_embedding
 from utils.vector_store import QdrantVectorStore
+from utils.semantic_cache import SemanticCache
 from models.recommender import BaseRecommender
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Maximum size of a job description page we are willing to download
+MAX_PAGE_BYTES = 2_000_000
+
+class PageTooLargeError(Exception):
+    """Raised when a job description page exceeds MAX_PAGE_BYTES"""
 
 # Define SHLRecommender class for use in Streamlit app
 class SHLRecommender:
     def __init__(self, collection_name="shl_assessments"):
         """Initialize the SHL Recommender with a vector store"""
-        self.vector_store = QdrantVectorStore(collection_name=collection_name)
-        self.base_recommender = BaseRecommender(vector_store=self.vector_store)
+        # One long-lived gRPC client so connections are reused across requests
+        self.vector_store = QdrantVectorStore(collection_name=collection_name, prefer_grpc=True, pool_size=32)
+        self.vector_store.warmup()
+        # Results are cached here rather than in BaseRecommender so enhanced queries are covered too
+        self.base_recommender = BaseRecommender(vector_store=self.vector_store, semantic_cache=False)
+        self.cache = SemanticCache(maxsize=512)
+        # Extracted page text by URL, revalidated with ETag / Last-Modified
+        self.url_cache = TTLCache(maxsize=512, ttl=3600)
+        self._url_cache_lock = threading.Lock()
     
     def recommend(self, query: str, top_k: int = 10, enhanced: bool = False, 
-                  filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+                  filters: Optional[Dict[str, Any]] = None,
+                  search_params: Optional[Dict[str, Any]] = None) -> List[Dict]:
         """
         Recommend assessments based on a text query
         
@@ -29,10 +48,20 @@ class SHLRecommender:
             top_k: Number of recommendations to return
             enhanced: Whether to use enhanced query processing with GPT
             filters: Dict of filters to apply (remote_testing, adaptive_irt, test_type)
+            search_params: Per-call overrides for hnsw_ef, oversampling and payload_fields
             
         Returns:
             List of assessment recommendations
         """
+        # Serve near-duplicate queries from the semantic cache
+        query_vector = get_embedding(query)
+        cache_key = self.cache.make_key(enhanced, [filters, self.base_recommender._search_kwargs(search_params)])
+        cached = self.cache.get(query_vector, cache_key, top_k)
+        if cached is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Semantic cache hit (top_k=%d, enhanced=%s)", top_k, enhanced)
+            return cached
+        
         # Extract filter parameters
         remote_testing = filters.get("remote_testing") if filters else None
         adaptive_irt = filters.get("adaptive_irt") if filters else None
@@ -45,7 +74,8 @@ class SHLRecommender:
                 remote_testing=remote_testing,
                 adaptive_irt=adaptive_irt,
                 test_types=test_types,
-                limit=top_k
+                limit=top_k,
+                search_params=search_params
             )
         else:
             recommendations = self.base_recommender.process_query(
@@ -53,13 +83,82 @@ class SHLRecommender:
                 remote_testing=remote_testing,
                 adaptive_irt=adaptive_irt,
                 test_types=test_types,
-                limit=top_k
+                limit=top_k,
+                query_vector=query_vector,
+                search_params=search_params
             )
         
+        self.cache.put(query_vector, cache_key, top_k, recommendations)
         return recommendations
     
+    def batch_recommend(self, queries: List[str], top_k: int = 10, enhanced: bool = False,
+                        filters: Optional[Dict[str, Any]] = None,
+                        batch_size: int = 32,
+                        search_params: Optional[Dict[str, Any]] = None) -> List[List[Dict]]:
+        """
+        Recommend assessments for several text queries at once
+        
+        Queries are embedded together and searched with one Qdrant batch request
+        per group of batch_size queries.
+        
+        Args:
+            queries: List of search queries or job descriptions
+            top_k: Number of recommendations to return per query
+            enhanced: Whether to use enhanced query processing with GPT
+            filters: Dict of filters to apply to every query
+            batch_size: Number of queries embedded and searched per request
+            search_params: Per-call overrides for hnsw_ef, oversampling and payload_fields
+            
+        Returns:
+            List of assessment recommendations for each query, in input order
+        """
+        results = []
+        for start in range(0, len(queries), batch_size):
+            results.extend(self._batch_recommend_group(
+                queries[start:start + batch_size], top_k, enhanced, filters, search_params
+            ))
+        return results
+    
+    def _batch_recommend_group(self, queries: List[str], top_k: int, enhanced: bool,
+                               filters: Optional[Dict[str, Any]],
+                               search_params: Optional[Dict[str, Any]] = None) -> List[List[Dict]]:
+        """Recommend assessments for one group of queries"""
+        # Embed the whole group in one request and serve near-duplicates from the semantic cache
+        query_vectors = get_embeddings_batch(queries)
+        cache_key = self.cache.make_key(enhanced, [filters, self.base_recommender._search_kwargs(search_params)])
+        results = [self.cache.get(vector, cache_key, top_k) for vector in query_vectors]
+        misses = [i for i, cached in enumerate(results) if cached is None]
+        if not misses:
+            return results
+        
+        # Embed the (optionally GPT-enhanced) text for the queries that missed
+        if enhanced:
+            enhanced_queries = asyncio.run(
+                self.base_recommender._enhance_many([queries[i] for i in misses])
+            )
+            search_vectors = get_embeddings_batch(enhanced_queries)
+        else:
+            search_vectors = [query_vectors[i] for i in misses]
+        
+        batch_results = self.base_recommender.process_queries(
+            [queries[i] for i in misses],
+            remote_testing=filters.get("remote_testing") if filters else None,
+            adaptive_irt=filters.get("adaptive_irt") if filters else None,
+            test_types=filters.get("test_type") if filters else None,
+            limit=top_k,
+            query_vectors=search_vectors,
+            search_params=search_params
+        )
+        
+        for i, recommendations in zip(misses, batch_results):
+            self.cache.put(query_vectors[i], cache_key, top_k, recommendations)
+            results[i] = recommendations
+        
+        return results
+    
     def recommend_from_url(self, url: str, top_k: int = 10, enhanced: bool = False,
-                          filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+                          filters: Optional[Dict[str, Any]] = None,
+                          search_params: Optional[Dict[str, Any]] = None) -> List[Dict]:
         """
         Recommend assessments based on a job description URL
         
@@ -68,60 +167,144 @@ class SHLRecommender:
             top_k: Number of recommendations to return
             enhanced: Whether to use enhanced query processing with GPT
             filters: Dict of filters to apply (remote_testing, adaptive_irt, test_type)
+            search_params: Per-call overrides for hnsw_ef, oversampling and payload_fields
             
         Returns:
             List of assessment recommendations
         """
-        # Fetch content from URL
+        # Fetch content from URL, revalidating any cached copy
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            text_content = response.text
-            
-            # Extract text from HTML if needed
-            # This is a simple approach - could use BeautifulSoup for better extraction
-            from html import unescape
-            import re
-            
-            # Basic HTML tag removal
-            text_content = re.sub(r'<[^>]+>', ' ', text_content)
-            # Decode HTML entities
-            text_content = unescape(text_content)
-            # Remove extra whitespace
-            text_content = re.sub(r'\s+', ' ', text_content).strip()
+            cached_text, headers = self._conditional_headers(url)
+            with requests.get(url, headers=headers, stream=True, timeout=10) as response:
+                if response.status_code == 304 and cached_text is not None:
+                    text_content = cached_text
+                else:
+                    response.raise_for_status()
+                    _check_content_length(response.headers)
+                    
+                    # Read at most MAX_PAGE_BYTES and decode only what was read
+                    body = bytearray()
+                    for chunk in response.iter_content(chunk_size=65536):
+                        body.extend(chunk)
+                        if len(body) > MAX_PAGE_BYTES:
+                            raise PageTooLargeError(f"Page exceeds {MAX_PAGE_BYTES} bytes")
+                    html = body.decode(response.encoding or "utf-8", errors="replace")
+                    
+                    text_content = extract_text_from_html(html)
+                    self._store_page_text(url, response.headers, text_content)
             
             # Use the extracted text for recommendations
-            return self.recommend(text_content, top_k, enhanced, filters)
+            return self.recommend(text_content, top_k, enhanced, filters, search_params)
             
+        except PageTooLargeError:
+            raise
         except Exception as e:
             raise Exception(f"Error fetching job description from URL: {e}")
-
-# Original functions
-def build_embeddings(data_file, collection_name):
-    """Build and store assessment embeddings"""
-    # Prepare assessment data
-    df = prepare_assessment_data(data_file)
-    print(f"Loaded {len(df)} assessments")
     
-    # Create embeddings for the assessments
-    print("Generating embeddings...")
-    embeddings = batch_get_embeddings(df['combined_text'].tolist())
-    print(f"Generated {len(embeddings)} embeddings")
+    async def arecommend_from_url(self, url: str, top_k: int = 10, enhanced: bool = False,
+                                  filters: Optional[Dict[str, Any]] = None,
+                                  search_params: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        """
+        Async variant of recommend_from_url for use inside an event loop
+        
+        The page is fetched without blocking the loop and the recommendation
+        itself runs in a worker thread.
+        
+        Args:
+            url: URL of the job description
+            top_k: Number of recommendations to return
+            enhanced: Whether to use enhanced query processing with GPT
+            filters: Dict of filters to apply (remote_testing, adaptive_irt, test_type)
+            search_params: Per-call overrides for hnsw_ef, oversampling and payload_fields
+            
+        Returns:
+            List of assessment recommendations
+        """
+        try:
+            cached_text, headers = self._conditional_headers(url)
+            async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached_text is not None:
+                        text_content = cached_text
+                    else:
+                        response.raise_for_status()
+                        _check_content_length(response.headers)
+                        
+                        # Read at most MAX_PAGE_BYTES and decode only what was read
+                        body = bytearray()
+                        async for chunk in response.aiter_bytes():
+                            body.extend(chunk)
+                            if len(body) > MAX_PAGE_BYTES:
+                                raise PageTooLargeError(f"Page exceeds {MAX_PAGE_BYTES} bytes")
+                        html = body.decode(response.encoding or "utf-8", errors="replace")
+                        
+                        text_content = extract_text_from_html(html)
+                        self._store_page_text(url, response.headers, text_content)
+        except PageTooLargeError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error fetching job description from URL: {e}")
+        
+        return await asyncio.to_thread(self.recommend, text_content, top_k, enhanced, filters, search_params)
     
-    # Create assessment payloads
-    payloads = create_assessment_payloads(df)
+    def _conditional_headers(self, url: str) -> Tuple[Optional[str], Dict[str, str]]:
+        """
+        Look up cached page text for a URL and the headers to revalidate it
+        
+        Args:
+            url: URL of the job description
+            
+        Returns:
+            Tuple of (cached text or None, conditional request headers)
+        """
+        with self._url_cache_lock:
+            cached = self.url_cache.get(url)
+        if cached is None:
+            return None, {}
+        
+        etag, last_modified, text_content = cached
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return text_content, headers
     
-    # Initialize vector store
-    print(f"Initializing vector store '{collection_name}'...")
-    vector_store = QdrantVectorStore(collection_name=collection_name)
+    def _store_page_text(self, url: str, headers, text_content: str) -> None:
+        """Cache extracted page text if the response carries validators"""
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if etag or last_modified:
+            with self._url_cache_lock:
+                self.url_cache[url] = (etag, last_modified, text_content)
+
+def _check_content_length(headers) -> None:
+    """Reject a response up front when its declared size is over MAX_PAGE_BYTES"""
+    content_length = headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_PAGE_BYTES:
+        raise PageTooLargeError(f"Page exceeds {MAX_PAGE_BYTES} bytes")
+
+def extract_text_from_html(html: str) -> str:
+    """
+    Extract plain text from an HTML page
     
-    # Add vectors to the store
-    print("Adding vectors to the store...")
-    vector_store.add_vectors(embeddings, payloads)
+    Args:
+        html: Raw HTML content
+        
+    Returns:
+        Text content with tags removed and whitespace collapsed
+    """
+    tree = LexborHTMLParser(html)
+    # Drop non-content elements before extracting text
+    tree.strip_tags(["script", "style", "noscript"])
+    root = tree.body if tree.body is not None else tree.root
+    if root is None:
+        return ""
     
-    print("Embedding build process completed successfully!")
-    return vector_store
+    # Extract text (entities are decoded by the parser) and collapse whitespace
+    return " ".join(root.text(separator=" ").split())
 
+# Original functions
 def recommend(vector_store, query, job_url=None, remote_testing=None, 
              adaptive_irt=None, test_types=None, limit=10, use_enhanced=False):
     """Generate recommendations for a query"""
@@ -162,6 +345,9 @@ def format_recommendations(recommendations):
     return formatted
 
 def main():
+    # Load environment variables
+    load_dotenv()
+    
     parser = argparse.ArgumentParser(description="SHL Assessment Recommender System")
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
     
@@ -171,6 +357,8 @@ def main():
                               help="Path to the assessments data CSV file")
     build_parser.add_argument("--collection-name", type=str, default="shl_assessments",
                               help="Name of the vector collection to create")
+    build_parser.add_argument("--recreate-collection", action="store_true",
+                              help="Delete and recreate the collection if its vector size doesn't match the model")
     
     # Recommend command
     recommend_parser = subparsers.add_parser("recommend", help="Generate recommendations")
@@ -207,7 +395,10 @@ def main():
     args = parser.parse_args()
     
     if args.command == "build":
-        build_embeddings(args.data_file, args.collection_name)
+        # Imported here so the API, which imports this module, doesn't load the build pipeline
+        from build_embeddings import build_embeddings
+        build_embeddings(args.data_file, args.collection_name,
+                         recreate_collection=args.recreate_collection)
     
     elif args.command == "recommend":
         # Initialize vector store
@@ -250,9 +441,9 @@ def main():
     elif args.command == "evaluate":
         from evaluate_recommender import load_test_queries, evaluate_recommender
         
-        # Initialize vector store and recommender
+        # Initialize vector store and recommender; caching would blur per-query metrics
         vector_store = QdrantVectorStore(collection_name=args.collection_name)
-        recommender = BaseRecommender(vector_store=vector_store)
+        recommender = BaseRecommender(vector_store=vector_store, semantic_cache=False)
         
         # Load test queries
         test_queries = load_test_queries(args.queries_file)
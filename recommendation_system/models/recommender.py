@@ -1,33 +1,133 @@
 import os
 import json
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
 from typing import Dict, List, Optional, Any, Union
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import numpy as np
-import pandas as pd
-from dotenv import load_dotenv
-from utils.vectorize import get_embedding
+from cachetools import LRUCache
+from tenacity import AsyncRetrying, Retrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from utils.vectorize import get_embedding, get_embeddings_batch, abatch_get_embeddings
 from utils.vector_store import QdrantVectorStore
+from utils.api_key_loader import get_openai_client, make_async_openai_client
+from utils.semantic_cache import SemanticCache
 
-# Load environment variables
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+# Model and output schema for GPT query enhancement
+ENHANCEMENT_MODEL = "gpt-4o-mini"
+ENHANCEMENT_SYSTEM_PROMPT = (
+    "You extract key skills and requirements from job descriptions. "
+    'Respond only with a JSON object of the form {"skills": [string, ...], "traits": [string, ...]}.'
+)
+
+# Enhanced queries by sha256 of the request, so repeated queries skip the GPT call
+_enhancement_cache = LRUCache(maxsize=4096)
+_enhancement_cache_lock = threading.Lock()
+
+# Retry policy for transient OpenAI errors; the SDK's own retries are disabled
+# on these calls so the two do not multiply
+GPT_RETRY_POLICY = {
+    "stop": stop_after_attempt(4),
+    "wait": wait_random_exponential(min=1, max=20),
+    "retry": retry_if_exception_type((openai.RateLimitError, openai.APITimeoutError,
+                                      openai.APIConnectionError, openai.InternalServerError)),
+    "reraise": True
+}
+
+class _CircuitBreaker:
+    """Skip calls to a failing service after too many recent failures"""
+    
+    def __init__(self, max_failures: int = 5, window: float = 60.0, cooldown: float = 30.0):
+        """
+        Initialize the circuit breaker
+        
+        Args:
+            max_failures: Failures within the window that open the circuit
+            window: Seconds over which failures are counted
+            cooldown: Seconds the circuit stays open before calls are tried again
+        """
+        self.max_failures = max_failures
+        self.window = window
+        self.cooldown = cooldown
+        self._failures = deque()
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """Return whether a call may be attempted"""
+        with self._lock:
+            return time.monotonic() >= self._open_until
+    
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if the threshold is reached"""
+        now = time.monotonic()
+        with self._lock:
+            self._failures.append(now)
+            while self._failures and self._failures[0] < now - self.window:
+                self._failures.popleft()
+            if len(self._failures) >= self.max_failures:
+                self._open_until = now + self.cooldown
+                self._failures.clear()
+                logger.warning("Too many GPT failures; skipping query enhancement for %.0fs", self.cooldown)
+
+_gpt_breaker = _CircuitBreaker()
+
+def _enhancement_cache_key(query: str, job_description_url: Optional[str] = None) -> str:
+    """Return the enhancement cache key for a query"""
+    return hashlib.sha256(f"{job_description_url or ''}\n{query}".encode("utf-8")).hexdigest()
 
 class BaseRecommender:
     """Base recommender class for SHL assessments"""
     
-    def __init__(self, vector_store):
+    def __init__(self, vector_store, semantic_cache: bool = True, hnsw_ef: Optional[int] = None,
+                 oversampling: float = 2.0, rescore: bool = True,
+                 payload_fields: Optional[List[str]] = None):
         """
         Initialize the recommender
         
         Args:
             vector_store: Vector store instance for retrieving assessments
+            semantic_cache: Whether to serve near-duplicate queries from an in-process cache
+            hnsw_ef: Size of the HNSW candidate list used for searches (the vector store's ef_search if None)
+            oversampling: Candidates fetched per result from the quantized index
+            rescore: Whether to rescore quantized candidates with the full vectors
+            payload_fields: Payload fields to return with each result (all fields if None)
         """
         self.vector_store = vector_store
+        self.cache = SemanticCache(maxsize=1024) if semantic_cache else None
+        self.hnsw_ef = hnsw_ef
+        self.oversampling = oversampling
+        self.rescore = rescore
+        self.payload_fields = payload_fields
+    
+    def _search_kwargs(self, search_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build the vector store search arguments for one call
+        
+        Args:
+            search_params: Per-call overrides for hnsw_ef, oversampling and payload_fields
+            
+        Returns:
+            Keyword arguments for QdrantVectorStore.search and search_batch
+        """
+        params = search_params or {}
+        return {
+            "hnsw_ef": params.get("hnsw_ef", self.hnsw_ef),
+            "oversampling": params.get("oversampling", self.oversampling),
+            "rescore": self.rescore,
+            "with_payload": params.get("payload_fields", self.payload_fields) or True,
+        }
     
     def process_query(self, query: str, remote_testing: Optional[str] = None,
                      adaptive_irt: Optional[str] = None, test_types: Optional[List[str]] = None,
-                     limit: int = 10) -> List[Dict]:
+                     limit: int = 10, query_vector: Optional[List[float]] = None,
+                     search_params: Optional[Dict[str, Any]] = None) -> List[Dict]:
         """
         Process a query and return relevant assessments
         
@@ -37,28 +137,94 @@ class BaseRecommender:
             adaptive_irt: Filter for adaptive/IRT support ("Yes" or "No")
             test_types: List of test types to include
             limit: Maximum number of results to return
+            query_vector: Precomputed embedding of the query, if already available
+            search_params: Per-call overrides for hnsw_ef, oversampling and payload_fields
             
         Returns:
             List of assessment dictionaries
         """
-        # Get the embedding for the query
-        query_embedding = get_embedding(query)
+        # Get the embedding for the query unless the caller already has it; the
+        # vector store normalizes it for the dot-product search
+        query_embedding = query_vector if query_vector is not None else get_embedding(query)
         
         # Prepare filters for the vector search
         filters = self._prepare_filters(remote_testing, adaptive_irt, test_types)
+        search_kwargs = self._search_kwargs(search_params)
+        
+        # Reuse the results of a near-identical earlier query if we have them
+        if self.cache is not None:
+            cache_key = self.cache.make_key(False, [remote_testing, adaptive_irt, test_types, search_kwargs])
+            cached = self.cache.get(query_embedding, cache_key, limit)
+            if cached is not None:
+                return cached
         
         # Search for similar assessments
         results = self.vector_store.search(
             query_embedding, 
             limit=limit,
-            filters=filters
+            filters=filters,
+            **search_kwargs
+        )
+        
+        if self.cache is not None:
+            self.cache.put(query_embedding, cache_key, limit, results)
+        
+        return results
+    
+    def process_queries(self, queries: List[str], remote_testing: Optional[str] = None,
+                        adaptive_irt: Optional[str] = None, test_types: Optional[List[str]] = None,
+                        limit: int = 10, query_vectors: Optional[List[List[float]]] = None,
+                        search_params: Optional[Dict[str, Any]] = None) -> List[List[Dict]]:
+        """
+        Process several queries with one embedding request and one vector search request
+        
+        Args:
+            queries: List of query strings
+            remote_testing: Filter for remote testing support ("Yes" or "No")
+            adaptive_irt: Filter for adaptive/IRT support ("Yes" or "No")
+            test_types: List of test types to include
+            limit: Maximum number of results to return per query
+            query_vectors: Precomputed embeddings of the queries, if already available
+            search_params: Per-call overrides for hnsw_ef, oversampling and payload_fields
+            
+        Returns:
+            List of assessment dictionaries for each query, in input order
+        """
+        # Embed all queries together unless the caller already has the vectors
+        if query_vectors is None:
+            query_vectors = get_embeddings_batch(queries)
+        
+        filters = self._prepare_filters(remote_testing, adaptive_irt, test_types)
+        search_kwargs = self._search_kwargs(search_params)
+        
+        # Serve what we can from the cache and only search for the rest
+        results = [None] * len(queries)
+        if self.cache is not None:
+            cache_key = self.cache.make_key(False, [remote_testing, adaptive_irt, test_types, search_kwargs])
+            results = [self.cache.get(vector, cache_key, limit) for vector in query_vectors]
+        misses = [i for i, cached in enumerate(results) if cached is None]
+        if not misses:
+            return results
+        
+        # Search for all remaining queries in a single round-trip
+        batch_results = self.vector_store.search_batch(
+            [query_vectors[i] for i in misses],
+            limit=limit,
+            filters=filters,
+            **search_kwargs
         )
         
+        for i, recommendations in zip(misses, batch_results):
+            if self.cache is not None:
+                self.cache.put(query_vectors[i], cache_key, limit, recommendations)
+            results[i] = recommendations
+        
         return results
     
     def enhanced_recommendations(self, query: str, job_description_url: Optional[str] = None,
                                remote_testing: Optional[str] = None, adaptive_irt: Optional[str] = None,
-                               test_types: Optional[List[str]] = None, limit: int = 10) -> List[Dict]:
+                               test_types: Optional[List[str]] = None, limit: int = 10,
+                               search_params: Optional[Dict[str, Any]] = None) -> List[Dict]:
         """
         Use GPT to enhance the query processing
         
@@ -69,6 +235,7 @@ class BaseRecommender:
             adaptive_irt: Filter for adaptive/IRT support ("Yes" or "No")
             test_types: List of test types to include
             limit: Maximum number of results to return
+            search_params: Per-call overrides for hnsw_ef, oversampling and payload_fields
             
         Returns:
             List of assessment dictionaries
@@ -82,9 +249,42 @@ class BaseRecommender:
             remote_testing=remote_testing,
             adaptive_irt=adaptive_irt,
             test_types=test_types,
-            limit=limit
+            limit=limit,
+            search_params=search_params
         )
     
+    async def enhanced_recommendations_many(self, queries: List[str],
+                                            remote_testing: Optional[str] = None,
+                                            adaptive_irt: Optional[str] = None,
+                                            test_types: Optional[List[str]] = None,
+                                            limit: int = 10,
+                                            max_concurrency: int = 20) -> List[List[Dict]]:
+        """
+        Enhanced recommendations for several queries, with the GPT, embedding
+        and search calls for all queries running concurrently
+        
+        Sync callers can use asyncio.run(recommender.enhanced_recommendations_many(...)).
+        
+        Args:
+            queries: List of query strings
+            remote_testing: Filter for remote testing support ("Yes" or "No")
+            adaptive_irt: Filter for adaptive/IRT support ("Yes" or "No")
+            test_types: List of test types to include
+            limit: Maximum number of results to return per query
+            max_concurrency: Maximum number of GPT requests in flight
+            
+        Returns:
+            List of assessment dictionaries for each query, in input order
+        """
+        enhanced_queries = await self._enhance_many(queries, max_concurrency)
+        query_vectors = await abatch_get_embeddings(enhanced_queries)
+        
+        return await asyncio.gather(*(
+            asyncio.to_thread(self.process_query, enhanced_query, remote_testing,
+                              adaptive_irt, test_types, limit, query_vector)
+            for enhanced_query, query_vector in zip(enhanced_queries, query_vectors)
+        ))
+    
     def _enhance_query_with_gpt(self, query: str, job_description_url: Optional[str] = None) -> str:
         """
         Use GPT to extract key skills and requirements from the query
@@ -96,12 +296,118 @@ class BaseRecommender:
         Returns:
             Enhanced query string
         """
+        # Reuse the result for a query we have already enhanced
+        cache_key = _enhancement_cache_key(query, job_description_url)
+        with _enhancement_cache_lock:
+            cached = _enhancement_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Use the original query while OpenAI is failing
+        if not _gpt_breaker.allow():
+            return query
+        
+        # Call the OpenAI API to enhance the query, retrying transient errors
+        try:
+            openai_client = get_openai_client().with_options(max_retries=0)
+            for attempt in Retrying(**GPT_RETRY_POLICY):
+                with attempt:
+                    response = openai_client.chat.completions.create(
+                        **self._enhancement_request(query, job_description_url)
+                    )
+            
+            # Combine the extracted terms with the original query for better results
+            enhanced_query = f"{query} {self._parse_enhancement(response.choices[0].message.content)}"
+            
+        except Exception as e:
+            _gpt_breaker.record_failure()
+            logger.warning("Error enhancing query with GPT: %s", e)
+            # Fall back to original query if there's an error
+            return query
+        
+        with _enhancement_cache_lock:
+            _enhancement_cache[cache_key] = enhanced_query
+        return enhanced_query
+    
+    async def _aenhance_query_with_gpt(self, async_client: AsyncOpenAI, semaphore: asyncio.Semaphore,
+                                       query: str, job_description_url: Optional[str] = None) -> str:
+        """
+        Async variant of _enhance_query_with_gpt
+        
+        Args:
+            async_client: AsyncOpenAI client to send the request with
+            semaphore: Semaphore bounding the number of requests in flight
+            query: The original query
+            job_description_url: Optional URL to a job description
+            
+        Returns:
+            Enhanced query string
+        """
+        cache_key = _enhancement_cache_key(query, job_description_url)
+        with _enhancement_cache_lock:
+            cached = _enhancement_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if not _gpt_breaker.allow():
+            return query
+        
+        try:
+            # The semaphore is only held while a request is in flight, not during backoff
+            openai_client = async_client.with_options(max_retries=0)
+            async for attempt in AsyncRetrying(**GPT_RETRY_POLICY):
+                with attempt:
+                    async with semaphore:
+                        response = await openai_client.chat.completions.create(
+                            **self._enhancement_request(query, job_description_url)
+                        )
+            
+            enhanced_query = f"{query} {self._parse_enhancement(response.choices[0].message.content)}"
+            
+        except Exception as e:
+            _gpt_breaker.record_failure()
+            logger.warning("Error enhancing query with GPT: %s", e)
+            return query
+        
+        with _enhancement_cache_lock:
+            _enhancement_cache[cache_key] = enhanced_query
+        return enhanced_query
+    
+    async def _enhance_many(self, queries: List[str], max_concurrency: int = 20) -> List[str]:
+        """
+        Enhance several queries with concurrent GPT requests
+        
+        Args:
+            queries: List of original queries
+            max_concurrency: Maximum number of requests in flight (keep within rate limits)
+            
+        Returns:
+            List of enhanced query strings, in input order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # The async client is scoped to this call so it never outlives its event loop
+        async with make_async_openai_client() as async_client:
+            return await asyncio.gather(*(
+                self._aenhance_query_with_gpt(async_client, semaphore, query)
+                for query in queries
+            ))
+    
+    def _enhancement_request(self, query: str, job_description_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the chat completion request asking GPT to extract skills from a query
+        
+        Args:
+            query: The original query
+            job_description_url: Optional URL to a job description
+            
+        Returns:
+            Keyword arguments for chat.completions.create
+        """
         # Prepare the prompt for GPT
         if job_description_url:
             prompt = f"""
             I have a job description available at {job_description_url}.
             Based on this job description, extract the key skills, competencies, and requirements.
-            Format them as a detailed list that can be used to search for relevant assessments.
             Focus on technical skills, personality traits, competencies, and cognitive abilities.
             """
         else:
@@ -110,43 +416,50 @@ class BaseRecommender:
             
             "{query}"
             
-            Format them as a detailed list that can be used to search for relevant assessments.
             Focus on technical skills, personality traits, competencies, and cognitive abilities.
             """
         
-        # Call the OpenAI API to enhance the query
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that extracts key skills and requirements from job descriptions."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.3
-            )
-            
-            # Extract the enhanced query from the response
-            enhanced_query = response.choices[0].message.content.strip()
-            
-            # Combine with original query for better results
-            return f"{query} {enhanced_query}"
+        return {
+            "model": ENHANCEMENT_MODEL,
+            "messages": [
+                {"role": "system", "content": ENHANCEMENT_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": {"type": "json_object"},
+            "max_tokens": 200,
+            "temperature": 0.3
+        }
+    
+    def _parse_enhancement(self, content: str) -> str:
+        """
+        Turn GPT's JSON reply into search terms
+        
+        Args:
+            content: Message content in the ENHANCEMENT_SYSTEM_PROMPT schema
             
-        except Exception as e:
-            print(f"Error enhancing query with GPT: {e}")
-            # Fall back to original query if there's an error
-            return query
+        Returns:
+            Skills and traits joined into one string
+        """
+        try:
+            data = json.loads(content)
+            terms = [str(term) for term in data.get("skills", []) + data.get("traits", [])]
+            return ", ".join(terms)
+        except (ValueError, TypeError, AttributeError):
+            # Use the raw text if the reply does not follow the schema
+            return content.strip()
     
     def _prepare_filters(self, remote_testing: Optional[str] = None,
                         adaptive_irt: Optional[str] = None,
-                        test_types: Optional[List[str]] = None) -> Dict[str, Any]:
+                        test_types: Optional[Union[List[str], str]] = None) -> Dict[str, Any]:
         """
         Prepare filters for the vector search
         
+        The vector store turns the dictionary into a Qdrant Filter and memoizes it.
+        
         Args:
             remote_testing: Filter for remote testing support ("Yes" or "No")
             adaptive_irt: Filter for adaptive/IRT support ("Yes" or "No")
-            test_types: List of test types to include
+            test_types: List of test types to include, or a single test type
             
         Returns:
             Dictionary of filters
@@ -159,7 +472,10 @@ class BaseRecommender:
         if adaptive_irt is not None:
             filters["adaptive_irt"] = adaptive_irt
         
+        # A single test type string is one value, not a sequence of characters
+        if isinstance(test_types, str):
+            test_types = [test_types]
         if test_types is not None and len(test_types) > 0:
-            filters["test_type"] = test_types
+            filters["test_type"] = list(test_types)
         
-        return filters 
\ No newline at end of file
+        return filters
@@ -1,4 +1,19 @@
+import os
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    dev_mode = bool(os.environ.get("DEV"))
+    # reload is incompatible with multiple workers, so only use it in development.
+    # Local Qdrant storage (qdrant_data/) is locked by the first process that opens
+    # it, so extra workers are only started when a Qdrant server is configured.
+    remote_qdrant = "QDRANT_URL" in os.environ and "QDRANT_API_KEY" in os.environ
+    workers = max(1, (os.cpu_count() or 1) // 2) if remote_qdrant and not dev_mode else 1
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        reload=dev_mode,
+        workers=workers
+    ) 
\ No newline at end of file
@@ -1,4 +1,3 @@
-import subprocess
 import os
 import sys
 from pathlib import Path
@@ -15,15 +14,16 @@ def main():
     
     print(f"Starting Streamlit app from: {app_path}")
     
-    # Run the streamlit app
+    # Run the streamlit app in this process rather than spawning a second interpreter
     try:
-        cmd = [
-            sys.executable, "-m", "streamlit", "run",
-            str(app_path),
-            "--server.port", "8501",
-            "--server.address", "localhost"
-        ]
-        subprocess.run(cmd)
+        from streamlit.web import bootstrap
+        
+        flag_options = {
+            "server.port": 8501,
+            "server.address": "localhost"
+        }
+        bootstrap.load_config_options(flag_options=flag_options)
+        bootstrap.run(str(app_path), False, [], flag_options)
         return 0
     except Exception as e:
         print(f"Error running Streamlit app: {e}")
@@ -20,19 +20,15 @@ if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
 # This helps find modules in Streamlit Cloud
-sys.path.append("/mount/src/shl-assignment")
+if "/mount/src/shl-assignment" not in sys.path:
+    sys.path.append("/mount/src/shl-assignment")
 
-# Setup environment before other imports
-try:
-    from dotenv import load_dotenv
-    load_dotenv()  # Load environment variables from .env file
-except ImportError:
-    # If python-dotenv isn't available, set up OpenAI API key directly
-    if "OPENAI_API_KEY" not in os.environ and hasattr(st, 'secrets') and "OPENAI_API_KEY" in st.secrets:
-        os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
-    elif "OPENAI_API_KEY" not in os.environ:
-        st.error("OpenAI API key not found. Please add it to your environment variables or .streamlit/secrets.toml")
-        st.stop()
+# Setup environment before other imports; load_env is memoized, so reruns
+# skip re-reading .env and the Streamlit secrets
+from utils.api_key_loader import load_env
+if not load_env():
+    st.error("OpenAI API key not found. Please add it to your environment variables or .streamlit/secrets.toml")
+    st.stop()
 
 # Debug information - moved after set_page_config
 debug_expander = st.sidebar.expander("Debug Info", expanded=False)
@@ -40,64 +36,86 @@ with debug_expander:
     st.write(f"Current working directory: {os.getcwd()}")
     st.write(f"Python path: {sys.path}")
 
-# Import our recommender after env setup
-try:
-    from main import SHLRecommender
-except ImportError as e:
-    st.error(f"Error importing SHLRecommender: {e}")
-    st.error(f"Trying absolute import...")
+# Directories searched for main.py when the normal imports fail
+MAIN_MODULE_DIRS = [parent_dir, "/mount/src/shl-assignment", "/mount/src/shl-assignment/recommendation_system"]
+
+# Resolve the recommender class once per process instead of on every rerun
+@st.cache_resource
+def _resolve_shl_recommender_cls():
+    errors = []
+    
+    try:
+        from main import SHLRecommender
+        return SHLRecommender, errors
+    except ImportError as e:
+        errors.append(f"Error importing SHLRecommender: {e}")
+    
     try:
         from recommendation_system.main import SHLRecommender
-    except ImportError as e2:
-        st.error(f"Still failed: {e2}")
-        try:
-            # Try one more approach by dynamically finding the main module
-            import importlib.util
-            import glob
-            
-            # Look for main.py in nearby directories
-            main_files = glob.glob(os.path.join(os.getcwd(), "**/main.py"), recursive=True)
-            if main_files:
-                # Use the first main.py found
-                debug_expander.write(f"Found main.py at: {main_files[0]}")
-                
+        return SHLRecommender, errors
+    except ImportError as e:
+        errors.append(f"Absolute import failed: {e}")
+    
+    try:
+        import importlib.util
+        
+        # Look for main.py in the known source directories
+        for directory in MAIN_MODULE_DIRS:
+            main_file = os.path.join(directory, "main.py")
+            if os.path.isfile(main_file):
                 # Load it as a module
-                spec = importlib.util.spec_from_file_location("main_module", main_files[0])
+                spec = importlib.util.spec_from_file_location("main_module", main_file)
                 main_module = importlib.util.module_from_spec(spec)
                 spec.loader.exec_module(main_module)
-                
-                # Get the SHLRecommender class
-                SHLRecommender = main_module.SHLRecommender
-            else:
-                st.error("Could not find main.py in any nearby directories")
-                st.stop()
-        except Exception as e3:
-            st.error(f"All import attempts failed: {e3}")
-            st.error("Falling back to standalone mode...")
-            
-            # Fall back to standalone implementation 
-            from streamlit_app.standalone_app import recommend, recommend_from_url
-            
-            # Create a minimal SHLRecommender that uses the standalone functions
-            class FallbackSHLRecommender:
-                def __init__(self):
-                    pass
-                
-                def recommend(self, query, top_k=5, enhanced=False, filters=None):
-                    return recommend(query, top_k, enhanced, filters)
-                
-                def recommend_from_url(self, url, top_k=5, enhanced=False, filters=None):
-                    return recommend_from_url(url, top_k, enhanced, filters)
-            
-            SHLRecommender = FallbackSHLRecommender
+                return main_module.SHLRecommender, errors
+        errors.append("Could not find main.py in any of the known directories")
+    except Exception as e:
+        errors.append(f"Loading main.py failed: {e}")
+    
+    # Fall back to standalone implementation
+    from streamlit_app.standalone_app import recommend, recommend_from_url
+    
+    # Create a minimal SHLRecommender that uses the standalone functions
+    class FallbackSHLRecommender:
+        def __init__(self):
+            pass
+        
+        # search_params only tunes Qdrant searches, so the standalone functions ignore it
+        def recommend(self, query, top_k=5, enhanced=False, filters=None, search_params=None):
+            return recommend(query, top_k, enhanced, filters)
+        
+        def recommend_from_url(self, url, top_k=5, enhanced=False, filters=None, search_params=None):
+            return recommend_from_url(url, top_k, enhanced, filters)
+        
+        def batch_recommend(self, queries, top_k=5, enhanced=False, filters=None, search_params=None):
+            return [recommend(query, top_k, enhanced, filters) for query in queries]
+    
+    errors.append("Falling back to standalone mode...")
+    return FallbackSHLRecommender, errors
+
+# Import our recommender after env setup
+SHLRecommender, import_errors = _resolve_shl_recommender_cls()
+for message in import_errors:
+    st.error(message)
+
+# Columns shown in the sample data table (the long descriptions are left out)
+SAMPLE_DATA_COLUMNS = ["name", "category", "job_levels", "assessment_length",
+                       "remote_testing", "adaptive_irt", "test_type", "url"]
 
-# Load sample data to show in the interface
+# Load sample data to show in the interface; the table is read from a Parquet
+# copy of the CSV, which already survives restarts
 @st.cache_data
+def _load_sample_table(data_path, csv_mtime):
+    # csv_mtime is only part of the cache key, so an edited CSV is reloaded
+    from utils.data_processor import load_display_data
+    
+    return load_display_data(data_path, SAMPLE_DATA_COLUMNS)
+
 def load_sample_data():
+    # Errors are reported here rather than cached as an empty table
     try:
         data_path = os.path.join(parent_dir, "data", "shl_assessments.csv")
-        sample_data = pd.read_csv(data_path)
-        return sample_data
+        return _load_sample_table(data_path, os.path.getmtime(data_path))
     except Exception as e:
         st.error(f"Error loading sample data: {e}")
         return pd.DataFrame()
@@ -111,6 +129,63 @@ def get_recommender():
         st.error(f"Error initializing recommender: {e}")
         return None
 
+# Build the recommender and warm its Qdrant connection at startup rather than on the first click
+with st.spinner("Warming up..."):
+    get_recommender()
+
+# HTML for one recommendation card, filled in with str.format
+CARD_TMPL = """
+<div class="assessment-card">
+    <div class="assessment-title">{i}. {a[name]}</div>
+    <div class="assessment-metadata">
+        <span class="badge">Length: {a[assessment_length]} min</span>
+        <span class="badge {remote_cls}">
+            Remote Testing: {a[remote_testing]}
+        </span>
+        <span class="badge {adaptive_cls}">
+            Adaptive: {a[adaptive_irt]}
+        </span>
+        <span class="badge">Type: {a[test_type]}</span>
+    </div>
+    <div class="assessment-description">
+        {a[description_short]}
+    </div>
+    <div style="margin-top: 10px;">
+        <a href="{a[url]}" target="_blank">View in SHL Catalog →</a>
+    </div>
+</div>
+"""
+
+# Payload fields the result cards need; the rest is not fetched from Qdrant
+CARD_PAYLOAD_FIELDS = ["name", "description_short", "remote_testing", "adaptive_irt",
+                       "test_type", "assessment_length", "url"]
+
+# Render a list of recommendations as assessment cards
+def display_results(results):
+    st.subheader(f"Top {len(results)} Recommended Assessments")
+    
+    if not results:
+        st.info("No assessments match your criteria. Try adjusting your filters.")
+        return
+    
+    # Collections built before description_short was added to the payload
+    for assessment in results:
+        if 'description_short' not in assessment:
+            description = assessment.get('description', '')
+            assessment['description_short'] = description[:300] + "..." if len(description) > 300 else description
+    
+    # Send all cards to the browser as a single element
+    cards = "".join(
+        CARD_TMPL.format(
+            i=i,
+            a=assessment,
+            remote_cls='yes-badge' if assessment['remote_testing'] == 'Yes' else 'no-badge',
+            adaptive_cls='yes-badge' if assessment['adaptive_irt'] == 'Yes' else 'no-badge'
+        )
+        for i, assessment in enumerate(results, 1)
+    )
+    st.markdown(cards, unsafe_allow_html=True)
+
 # Main function to run the app
 def main():
     # Custom CSS
@@ -182,6 +257,12 @@ def main():
         with advanced_options:
             enhanced_mode = st.checkbox("Use Enhanced Mode (GPT augmented)", value=True)
             top_k = st.slider("Number of recommendations", 1, 20, 5)
+            multi_query = st.checkbox("One query per line", value=False,
+                                      help="Search for each line of the description separately")
+            hnsw_ef = st.slider("Search accuracy (hnsw_ef)", 20, 500, 100, step=20,
+                                help="Larger values search more of the index: more accurate but slower")
+            oversampling = st.slider("Quantization oversampling", 1.0, 4.0, 2.0, step=0.5,
+                                     help="Candidates fetched per result before rescoring with full vectors")
         
         # Admin Functions
         admin_section = st.expander("Admin Functions", expanded=False)
@@ -190,6 +271,8 @@ def main():
             st.write("Upload assessment data and build embeddings in the vector store.")
             
             data_file = st.file_uploader("Upload SHL Assessments CSV", type="csv")
+            use_batch_api = st.checkbox("Use OpenAI Batch API",
+                                        help="Half the embedding cost, but the job can take a while to complete")
             
             if st.button("Build Embeddings", use_container_width=True):
                 if data_file is not None:
@@ -203,8 +286,16 @@ def main():
                             # Import the build_embeddings function
                             from build_embeddings import build_embeddings
                             
-                            # Build the embeddings
-                            build_embeddings(temp_file_path, "shl_assessments")
+                            # Build the embeddings, tracking the batch job if there is one
+                            progress_bar = st.progress(0.0, text="Submitting batch job...") if use_batch_api else None
+                            
+                            def show_progress(status, completed, total):
+                                progress_bar.progress(min(completed / max(total, 1), 1.0),
+                                                      text=f"Batch job {status}: {completed}/{total}")
+                            
+                            build_embeddings(temp_file_path, "shl_assessments",
+                                             use_batch_api=use_batch_api,
+                                             progress_callback=show_progress if use_batch_api else None)
                             
                             # Remove the temp file
                             os.remove(temp_file_path)
@@ -266,6 +357,14 @@ def main():
                 st.error("Failed to initialize the recommender.")
                 return
             
+            # Search tuning from Advanced Options, passed per call because the
+            # cached recommender is shared by every session
+            search_params = {
+                "hnsw_ef": hnsw_ef,
+                "oversampling": oversampling,
+                "payload_fields": CARD_PAYLOAD_FIELDS,
+            }
+            
             with st.spinner("Finding the best assessments for you..."):
                 try:
                     # Get recommendations
@@ -274,45 +373,32 @@ def main():
                             url=url,
                             top_k=top_k,
                             enhanced=enhanced_mode,
-                            filters=filters
+                            filters=filters,
+                            search_params=search_params
+                        )
+                        display_results(results)
+                    elif multi_query:
+                        # Embed and search all lines together in one batched request
+                        queries = [line.strip() for line in query.splitlines() if line.strip()]
+                        all_results = recommender.batch_recommend(
+                            queries,
+                            top_k=top_k,
+                            enhanced=enhanced_mode,
+                            filters=filters,
+                            search_params=search_params
                         )
+                        for line, results in zip(queries, all_results):
+                            st.markdown(f"#### {line}")
+                            display_results(results)
                     else:
                         results = recommender.recommend(
                             query=query,
                             top_k=top_k,
                             enhanced=enhanced_mode,
-                            filters=filters
+                            filters=filters,
+                            search_params=search_params
                         )
-                    
-                    # Display results
-                    st.subheader(f"Top {len(results)} Recommended Assessments")
-                    
-                    if not results:
-                        st.info("No assessments match your criteria. Try adjusting your filters.")
-                    
-                    for i, assessment in enumerate(results, 1):
-                        with st.container():
-                            st.markdown(f"""
-                            <div class="assessment-card">
-                                <div class="assessment-title">{i}. {assessment['name']}</div>
-                                <div class="assessment-metadata">
-                                    <span class="badge">Length: {assessment['assessment_length']} min</span>
-                                    <span class="badge {'yes-badge' if assessment['remote_testing'] == 'Yes' else 'no-badge'}">
-                                        Remote Testing: {assessment['remote_testing']}
-                                    </span>
-                                    <span class="badge {'yes-badge' if assessment['adaptive_irt'] == 'Yes' else 'no-badge'}">
-                                        Adaptive: {assessment['adaptive_irt']}
-                                    </span>
-                                    <span class="badge">Type: {assessment['test_type']}</span>
-                                </div>
-                                <div class="assessment-description">
-                                    {assessment['description'][:300]}{"..." if len(assessment['description']) > 300 else ""}
-                                </div>
-                                <div style="margin-top: 10px;">
-                                    <a href="{assessment['url']}" target="_blank">View in SHL Catalog →</a>
-                                </div>
-                            </div>
-                            """, unsafe_allow_html=True)
+                        display_results(results)
                 
                 except Exception as e:
                     st.error(f"Error getting recommendations: {e}")
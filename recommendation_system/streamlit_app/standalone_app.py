@@ -3,12 +3,63 @@ import os
 import sys
 import pandas as pd
 import json
+import hashlib
+import logging
 import numpy as np
-import requests
+import asyncio
+import threading
+import httpx
+from cachetools import LRUCache, TTLCache
+from html import unescape
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Tuple, Any, Union
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+try:
+    import simsimd
+except ImportError:
+    # SimSIMD is optional; without it scoring uses a NumPy matrix-vector product
+    simsimd = None
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    # HTTP/2 needs the h2 package (httpx[http2]); fall back to pooled HTTP/1.1
+    HTTP2_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # Numba is optional; without it scoring falls back to NumPy
+    njit = None
+
+try:
+    import tiktoken
+except ImportError:
+    # tiktoken is optional; without it long texts are truncated by word count
+    tiktoken = None
+
+try:
+    import hnswlib
+except ImportError:
+    # hnswlib is optional; without it every search is a brute-force scan
+    hnswlib = None
+
+try:
+    # selectolax parses HTML in C (lexbor), far faster than regex stripping
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    # google-re2 matches in linear time, so malformed pages can't trigger backtracking
+    import re2 as re
+except ImportError:
+    import re
 
 # Setup page configuration
 st.set_page_config(
@@ -36,25 +87,134 @@ client = OpenAI(api_key=openai_api_key)
 # Utility Functions
 #--------------------
 
+# Patterns used to strip HTML from job description pages
+_TAG_RE = re.compile(r'<[^>]+>')
+_WS_RE = re.compile(r'\s+')
+
+# Page elements that never hold job description text
+_NOISE_TAGS = ["script", "style", "nav", "footer"]
+
+# Only the first MAX_PAGE_BYTES of a job page are downloaded and parsed
+MAX_PAGE_BYTES = 512 * 1024
+
+# Extracted page text by URL, revalidated with ETag / Last-Modified
+URL_TEXT_CACHE = TTLCache(maxsize=256, ttl=3600)
+_url_cache_lock = threading.Lock()
+
+# Embedding models have an 8191 token limit; stay a bit below it
+MAX_EMBEDDING_TOKENS = 8000
+
+@st.cache_resource(show_spinner=False)
+def get_token_encoding(model: str):
+    """Return the tiktoken encoding for a model, or None without tiktoken"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding files are downloaded on first use, which fails offline
+        print(f"Could not load the tiktoken encoding, truncating by words: {e}")
+        return None
+
+def truncate_to_token_limit(text: str, model: str) -> str:
+    """Cut text to MAX_EMBEDDING_TOKENS tokens, counted with tiktoken (or as words without it)"""
+    # Every token covers at least one UTF-8 byte, so short texts can't be over the limit
+    if len(text) * 4 <= MAX_EMBEDDING_TOKENS:
+        return text
+    
+    encoding = get_token_encoding(model)
+    if encoding is None:
+        words = text.split()
+        return " ".join(words[:MAX_EMBEDDING_TOKENS]) if len(words) > MAX_EMBEDDING_TOKENS else text
+    
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:MAX_EMBEDDING_TOKENS]) if len(tokens) > MAX_EMBEDDING_TOKENS else text
+
 def get_embedding(text: str, model: str = "text-embedding-ada-002") -> List[float]:
     """Get embedding for a text string"""
     if not isinstance(text, str):
         text = str(text)
     
-    # Truncate long texts to the model's context limit
-    max_tokens = 8000
-    if len(text.split()) > max_tokens:
-        text = " ".join(text.split()[:max_tokens])
-    
     try:
-        response = client.embeddings.create(
-            model=model,
-            input=text
-        )
-        return response.data[0].embedding
+        return list(_cached_embedding(model, text))
     except Exception as e:
-        st.error(f"Error getting embedding: {e}")
-        return [0.0] * 1536  # Return a zero vector in case of error
+        # Re-raise rather than return a zero vector, which would score arbitrarily
+        logger.error("Error getting embedding: %s", e)
+        raise
+
+@st.cache_resource(show_spinner=False)
+def get_embedding_cache() -> Tuple[LRUCache, threading.Lock]:
+    """Embeddings by (model, text), shared by the sync and async paths across reruns and sessions"""
+    return LRUCache(maxsize=1024), threading.Lock()
+
+def _lookup_embedding(model: str, text: str) -> Optional[Tuple[float, ...]]:
+    """Return the cached embedding for a text, or None"""
+    cache, lock = get_embedding_cache()
+    with lock:
+        return cache.get((model, text))
+
+def _store_embedding(model: str, text: str, embedding: Tuple[float, ...]) -> None:
+    """Cache an embedding for later queries"""
+    cache, lock = get_embedding_cache()
+    with lock:
+        cache[(model, text)] = embedding
+
+def _cached_embedding(model: str, text: str) -> Tuple[float, ...]:
+    """Fetch an embedding, memoized across reruns; errors propagate so they are not cached"""
+    cached = _lookup_embedding(model, text)
+    if cached is not None:
+        return cached
+    
+    response = client.embeddings.create(
+        model=model,
+        input=truncate_to_token_limit(text, model)
+    )
+    embedding = tuple(response.data[0].embedding)
+    _store_embedding(model, text, embedding)
+    return embedding
+
+@st.cache_resource(show_spinner=False)
+def get_async_runtime() -> Tuple[asyncio.AbstractEventLoop, AsyncOpenAI]:
+    """
+    Background event loop and the AsyncOpenAI client used on it
+    
+    The client's pooled connections belong to the loop they were opened on, so
+    async work runs on this long-lived loop instead of a new asyncio.run() loop
+    (and client) per call.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="async-openai", daemon=True).start()
+    return loop, AsyncOpenAI(api_key=openai_api_key)
+
+def run_async(coro):
+    """Run a coroutine on the shared background loop and wait for its result"""
+    loop, _ = get_async_runtime()
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+def get_embeddings_batch(texts: List[str], model: str = "text-embedding-ada-002",
+                         batch_size: int = 512) -> np.ndarray:
+    """Get embeddings for many texts, one API request per batch_size texts"""
+    # Send texts of similar length together, then restore the input order
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    embeddings = np.zeros((len(texts), 1536), dtype=np.float32)
+    
+    for start in range(0, len(texts), batch_size):
+        batch_idx = order[start:start + batch_size]
+        try:
+            response = client.embeddings.create(
+                model=model,
+                input=[texts[i] for i in batch_idx]
+            )
+            embeddings[batch_idx] = np.array([item.embedding for item in response.data], dtype=np.float32)
+        except Exception as e:
+            # Re-raise rather than leave zero rows in the matrix
+            logger.error("Error getting embeddings: %s", e)
+            raise
+    
+    return embeddings
 
 #--------------------
 # Sample Data
@@ -124,8 +284,8 @@ SAMPLE_ASSESSMENTS = [
     }
 ]
 
-# Pre-compute embeddings for sample data
-SAMPLE_EMBEDDINGS = []
+# Text embedded for each sample assessment
+SAMPLE_TEXTS = []
 for assessment in SAMPLE_ASSESSMENTS:
     combined_text = (
         assessment['name'] + '. ' + 
@@ -134,7 +294,102 @@ for assessment in SAMPLE_ASSESSMENTS:
         'Job levels: ' + assessment['job_levels'] + '. ' +
         'Test type: ' + assessment['test_type'] + '.'
     )
-    SAMPLE_EMBEDDINGS.append(combined_text)
+    SAMPLE_TEXTS.append(combined_text)
+    # Truncated description shown on result cards
+    description = assessment['description']
+    assessment['description_short'] = description[:300] + "..." if len(description) > 300 else description
+
+# Directory holding embeddings persisted between restarts
+EMBEDDING_CACHE_DIR = Path(__file__).resolve().parent / "cache"
+
+@st.cache_resource
+def load_sample_matrix(model: str = "text-embedding-ada-002") -> np.ndarray:
+    """
+    Load the sample embedding matrix, computing it only if the sample texts changed
+    
+    Rows are L2-normalized so cosine similarity against a unit query is a plain
+    dot product, then stored as float16 to halve the bytes read per search. The
+    matrix is saved under EMBEDDING_CACHE_DIR keyed by a hash of the model and
+    texts, so restarts skip the API calls. It is built on the first search
+    rather than at import, and cache_resource shares one copy across all
+    sessions and reruns.
+    """
+    content_hash = hashlib.sha256(json.dumps([model, SAMPLE_TEXTS]).encode("utf-8")).hexdigest()[:16]
+    cache_file = EMBEDDING_CACHE_DIR / f"sample_embeddings_{content_hash}.npy"
+    if cache_file.exists():
+        return np.load(cache_file).astype(np.float16, copy=False)
+    
+    matrix = get_embeddings_batch(SAMPLE_TEXTS, model)
+    # Raise instead of returning zero rows: cache_resource would keep them (and
+    # every search would score zero) until restart, while exceptions aren't cached
+    if not np.all(matrix.any(axis=1)):
+        raise ValueError("The embedding API returned zero vectors for some sample assessments")
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix.astype(np.float16)
+    
+    try:
+        EMBEDDING_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        np.save(cache_file, matrix)
+    except OSError:
+        # Read-only deployments just recompute on restart
+        pass
+    
+    return matrix
+
+# Columnar copy of the sample data: one array per field, indexed by assessment row
+SAMPLE_COLUMNS = {
+    key: np.array([assessment[key] for assessment in SAMPLE_ASSESSMENTS], dtype=object)
+    for key in SAMPLE_ASSESSMENTS[0]
+}
+NUM_SAMPLES = len(SAMPLE_ASSESSMENTS)
+
+# Boolean mask per test type, built once for filtering
+TEST_TYPE_MASKS = {}
+for row, test_types in enumerate(SAMPLE_COLUMNS["test_type"]):
+    for test_type in test_types.split(", "):
+        TEST_TYPE_MASKS.setdefault(test_type, np.zeros(NUM_SAMPLES, dtype=bool))[row] = True
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _dot_scores(matrix: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """Dot product of every matrix row with q, fused and spread across cores"""
+        out = np.empty(matrix.shape[0], dtype=np.float32)
+        for i in prange(matrix.shape[0]):
+            total = np.float32(0.0)
+            for j in range(matrix.shape[1]):
+                total += matrix[i, j] * q[j]
+            out[i] = total
+        return out
+
+@st.cache_resource
+def load_sample_matrix_f32() -> np.ndarray:
+    """
+    Float32 copy of the sample matrix for scoring without SimSIMD
+    
+    Neither Numba nor NumPy's BLAS has float16 kernels, so widening once here
+    is far cheaper than a float16 product per search. The Numba kernel is
+    compiled here too, so the first search doesn't pay for it.
+    """
+    matrix = load_sample_matrix().astype(np.float32)
+    if njit is not None:
+        _dot_scores(matrix[:1], np.zeros(matrix.shape[1], dtype=np.float32))
+    return matrix
+
+# Catalog size from which an HNSW index beats the brute-force scan
+ANN_THRESHOLD = 1000
+
+@st.cache_resource
+def load_sample_index():
+    """Build an HNSW index over the sample matrix, or return None when brute force is faster"""
+    if hnswlib is None or NUM_SAMPLES < ANN_THRESHOLD:
+        return None
+    
+    matrix = load_sample_matrix()
+    index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+    index.init_index(max_elements=NUM_SAMPLES, ef_construction=200, M=16)
+    index.add_items(matrix.astype(np.float32), np.arange(NUM_SAMPLES))
+    index.set_ef(64)
+    return index
 
 #--------------------
 # Recommender Logic
@@ -143,71 +398,259 @@ for assessment in SAMPLE_ASSESSMENTS:
 def recommend(query: str, top_k: int = 5, enhanced: bool = False, 
               filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
     """Recommend assessments based on a text query"""
-    # Get the embedding for the query
-    query_embedding = get_embedding(query)
-    
-    # Calculate similarity scores with all sample assessments
-    results = []
-    for i, assessment in enumerate(SAMPLE_ASSESSMENTS):
-        # Skip if it doesn't match filters
-        if filters:
-            skip = False
-            for key, value in filters.items():
-                if key == "test_type" and isinstance(value, list):
-                    # For test types, check if any match
-                    assessment_types = assessment["test_type"].split(", ")
-                    if not any(t in assessment_types for t in value):
-                        skip = True
-                        break
-                elif key in assessment and assessment[key] != value:
-                    skip = True
-                    break
-            if skip:
-                continue
-                
-        # Get the embedding for the assessment
-        assessment_embedding = get_embedding(SAMPLE_EMBEDDINGS[i])
-        
-        # Calculate cosine similarity
-        similarity = np.dot(query_embedding, assessment_embedding) / (
-            np.linalg.norm(query_embedding) * np.linalg.norm(assessment_embedding)
+    return _rank(get_embedding(query), top_k, filters)
+
+def _rank(query_embedding: List[float], top_k: int = 5,
+          filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+    """Rank the sample assessments against a query embedding"""
+    # Normalize the query embedding
+    q = np.asarray(query_embedding, dtype=np.float32)
+    q /= max(np.linalg.norm(q), 1e-12)
+    
+    # Large catalogs go through the HNSW index instead of scoring every row
+    index = load_sample_index()
+    if index is not None:
+        results = _ann_rank(index, q, top_k, filters)
+        if results is not None:
+            return results
+    
+    # Score every assessment at once; both sides are unit length, so the dot
+    # product is the cosine similarity
+    if simsimd is not None:
+        # SimSIMD reads the float16 matrix directly
+        q = q.astype(np.float16)
+        scores = np.asarray(simsimd.cdist(q.reshape(1, -1), load_sample_matrix(), metric="dot"), dtype=np.float32).ravel()
+    elif njit is not None:
+        scores = _dot_scores(load_sample_matrix_f32(), q)
+    else:
+        scores = load_sample_matrix_f32() @ q
+    
+    # Exclude assessments that don't match the filters
+    num_candidates = NUM_SAMPLES
+    if filters:
+        mask = _filter_mask(filters)
+        scores[~mask] = -np.inf
+        num_candidates = int(mask.sum())
+    
+    # Select the top_k highest scores without sorting everything; argpartition is
+    # O(N) and only the k winners are sorted
+    k = min(top_k, num_candidates)
+    if k == 0:
+        return []
+    neg_scores = -scores
+    top_idx = np.argpartition(neg_scores, k - 1)[:k] if k < num_candidates else np.flatnonzero(np.isfinite(scores))
+    top_idx = top_idx[np.argsort(neg_scores[top_idx], kind="stable")]
+    
+    return [_result_row(i, scores[i]) for i in top_idx]
+
+def _ann_rank(index, q: np.ndarray, top_k: int,
+              filters: Optional[Dict[str, Any]] = None) -> Optional[List[Dict]]:
+    """Rank with the HNSW index, or return None if it can't produce enough results"""
+    mask = _filter_mask(filters) if filters else None
+    k = min(top_k, NUM_SAMPLES if mask is None else int(mask.sum()))
+    if k == 0:
+        return []
+    
+    try:
+        labels, distances = index.knn_query(
+            q, k=k, filter=(lambda label: bool(mask[label])) if mask is not None else None
         )
-        
-        # Add to results
-        assessment_copy = assessment.copy()
-        assessment_copy["relevance_score"] = float(similarity)
-        results.append(assessment_copy)
+    except RuntimeError:
+        # Very selective filters can leave the graph search short of k hits
+        return None
     
-    # Sort by similarity score and take top_k
-    results.sort(key=lambda x: x["relevance_score"], reverse=True)
-    return results[:top_k]
+    # Inner-product distance is 1 - dot, and the vectors are unit length
+    return [_result_row(i, 1.0 - d) for i, d in zip(labels[0], distances[0])]
+
+def _result_row(i: int, score: float) -> Dict:
+    """Build the result dict for one assessment row, only ever called for the top_k rows"""
+    return {**SAMPLE_ASSESSMENTS[i], "relevance_score": float(score)}
+
+def _filter_mask(filters: Dict[str, Any]) -> np.ndarray:
+    """Return a boolean mask of the assessments that satisfy all filters"""
+    keep = np.ones(NUM_SAMPLES, dtype=bool)
+    for key, value in filters.items():
+        if key == "test_type" and isinstance(value, list):
+            # For test types, keep assessments matching any of them
+            any_type = np.zeros(NUM_SAMPLES, dtype=bool)
+            for test_type in value:
+                if test_type in TEST_TYPE_MASKS:
+                    any_type |= TEST_TYPE_MASKS[test_type]
+            keep &= any_type
+        elif key in SAMPLE_COLUMNS:
+            keep &= SAMPLE_COLUMNS[key] == value
+    return keep
 
 def recommend_from_url(url: str, top_k: int = 5, enhanced: bool = False,
                       filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
     """Recommend assessments based on a job description URL"""
+    _, async_client = get_async_runtime()
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        text_content = response.text
-        
-        # Basic HTML tag removal and cleanup
-        from html import unescape
-        import re
-        text_content = re.sub(r'<[^>]+>', ' ', text_content)
-        text_content = unescape(text_content)
-        text_content = re.sub(r'\s+', ' ', text_content).strip()
-        
-        # Use the extracted text for recommendations
-        return recommend(text_content, top_k, enhanced, filters)
-        
+        query_embedding = run_async(_url_embedding_async(url, async_client))
     except Exception as e:
         st.error(f"Error fetching job description from URL: {e}")
         return []
+    return _rank(query_embedding, top_k, filters)
+
+async def _url_embedding_async(url: str, async_client: AsyncOpenAI) -> List[float]:
+    """Fetch a job description page and embed its text without blocking on I/O"""
+    # Revalidate any cached copy instead of downloading it again
+    cached_text, headers = _conditional_headers(url)
+    response_headers, html = await asyncio.to_thread(_fetch_page, url, headers)
+    if html is None:
+        text_content = cached_text
+    else:
+        text_content = _html_to_text(html)
+        _store_page_text(url, response_headers, text_content)
+    
+    # Use the extracted text for recommendations
+    return await get_embedding_async(text_content, async_client)
+
+@st.cache_resource
+def get_http_client() -> httpx.Client:
+    """Shared HTTP client for job description pages, so pooled connections survive reruns"""
+    return httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        timeout=10,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        headers={"User-Agent": "SHL-Assessment-Recommender/1.0"}
+    )
+
+def _fetch_page(url: str, headers: Dict[str, str]) -> Tuple[httpx.Headers, Optional[str]]:
+    """
+    Download at most MAX_PAGE_BYTES of a page
+    
+    Returns the response headers and the decoded HTML, or None for the HTML
+    when a conditional request came back 304 Not Modified.
+    """
+    with get_http_client().stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and headers:
+            return response.headers, None
+        response.raise_for_status()
+        
+        # Stop reading once the cap is reached; the job description is near the top
+        body = bytearray()
+        for chunk in response.iter_bytes(chunk_size=65536):
+            body.extend(chunk)
+            if len(body) >= MAX_PAGE_BYTES:
+                break
+        html = bytes(body[:MAX_PAGE_BYTES]).decode(response.encoding or "utf-8", errors="replace")
+        return response.headers, html
+
+def _conditional_headers(url: str) -> Tuple[Optional[str], Dict[str, str]]:
+    """Look up cached page text for a URL and the headers to revalidate it"""
+    with _url_cache_lock:
+        cached = URL_TEXT_CACHE.get(url)
+    if cached is None:
+        return None, {}
+    
+    etag, last_modified, text_content = cached
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return text_content, headers
+
+def _store_page_text(url: str, headers, text_content: str) -> None:
+    """Cache extracted page text if the response carries validators"""
+    etag = headers.get("etag")
+    last_modified = headers.get("last-modified")
+    if etag or last_modified:
+        with _url_cache_lock:
+            URL_TEXT_CACHE[url] = (etag, last_modified, text_content)
+
+def _html_to_text(html: str) -> str:
+    """Extract the visible text from an HTML page"""
+    if HTMLParser is not None:
+        tree = HTMLParser(html)
+        tree.strip_tags(_NOISE_TAGS)
+        root = tree.body or tree.root
+        text = root.text(separator=" ") if root is not None else ""
+    else:
+        # Basic HTML tag removal and cleanup
+        text = unescape(_TAG_RE.sub(' ', html))
+    
+    return _WS_RE.sub(' ', text).strip()
+
+async def get_embedding_async(text: str, async_client: AsyncOpenAI,
+                              model: str = "text-embedding-ada-002") -> List[float]:
+    """Get embedding for a text string with an async client; errors propagate so they are not cached"""
+    if not isinstance(text, str):
+        text = str(text)
+    
+    cached = _lookup_embedding(model, text)
+    if cached is not None:
+        return list(cached)
+    
+    response = await async_client.embeddings.create(
+        model=model,
+        input=truncate_to_token_limit(text, model)
+    )
+    embedding = tuple(response.data[0].embedding)
+    _store_embedding(model, text, embedding)
+    return list(embedding)
+
+async def _embed_many_async(queries: List[str], async_client: AsyncOpenAI,
+                            max_concurrency: int = 16) -> List[Union[List[float], Exception]]:
+    """Embed several queries concurrently; a failed query comes back as its exception"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def embed(query: str) -> List[float]:
+        async with semaphore:
+            return await get_embedding_async(query, async_client)
+    
+    return await asyncio.gather(*(embed(query) for query in queries), return_exceptions=True)
+
+def recommend_many(queries: List[str], top_k: int = 5, enhanced: bool = False,
+                   filters: Optional[Dict[str, Any]] = None) -> List[List[Dict]]:
+    """Recommend assessments for several queries, embedding them concurrently"""
+    _, async_client = get_async_runtime()
+    all_results = []
+    for query_embedding in run_async(_embed_many_async(queries, async_client)):
+        if isinstance(query_embedding, Exception):
+            st.error(f"Error getting embedding: {query_embedding}")
+            all_results.append([])
+        else:
+            all_results.append(_rank(query_embedding, top_k, filters))
+    return all_results
 
 #--------------------
 # Streamlit App
 #--------------------
 
+def display_results(results):
+    """Render a list of recommendations as assessment cards"""
+    st.subheader(f"Top {len(results)} Recommended Assessments")
+    
+    if not results:
+        st.info("No assessments match your criteria. Try adjusting your filters.")
+    
+    for i, assessment in enumerate(results, 1):
+        with st.container():
+            st.markdown(f"""
+            <div class="assessment-card">
+                <div class="assessment-title">{i}. {assessment['name']}</div>
+                <div class="assessment-metadata">
+                    <span class="badge">Length: {assessment['assessment_length']} min</span>
+                    <span class="badge {'yes-badge' if assessment['remote_testing'] == 'Yes' else 'no-badge'}">
+                        Remote Testing: {assessment['remote_testing']}
+                    </span>
+                    <span class="badge {'yes-badge' if assessment['adaptive_irt'] == 'Yes' else 'no-badge'}">
+                        Adaptive: {assessment['adaptive_irt']}
+                    </span>
+                    <span class="badge">Type: {assessment['test_type']}</span>
+                </div>
+                <div class="assessment-description">
+                    {assessment['description_short']}
+                </div>
+                <div style="margin-top: 10px;">
+                    <a href="{assessment['url']}" target="_blank">View in SHL Catalog →</a>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+
 def main():
     # Custom CSS
     st.markdown("""
@@ -280,6 +723,8 @@ def main():
         with advanced_options:
             enhanced_mode = st.checkbox("Use Enhanced Mode (GPT augmented)", value=True)
             top_k = st.slider("Number of recommendations", 1, 5, 3)
+            multi_query = st.checkbox("One query per line", value=False,
+                                      help="Search for each line of the description separately")
         
         st.divider()
         st.markdown("### About")
@@ -339,6 +784,19 @@ def main():
                             enhanced=enhanced_mode,
                             filters=filters if filters else None
                         )
+                        display_results(results)
+                    elif multi_query:
+                        # Embed all lines concurrently
+                        queries = [line.strip() for line in query.splitlines() if line.strip()]
+                        all_results = recommend_many(
+                            queries,
+                            top_k=top_k,
+                            enhanced=enhanced_mode,
+                            filters=filters if filters else None
+                        )
+                        for line, results in zip(queries, all_results):
+                            st.markdown(f"#### {line}")
+                            display_results(results)
                     else:
                         results = recommend(
                             query=query,
@@ -346,43 +804,15 @@ def main():
                             enhanced=enhanced_mode,
                             filters=filters if filters else None
                         )
-                    
-                    # Display results
-                    st.subheader(f"Top {len(results)} Recommended Assessments")
-                    
-                    if not results:
-                        st.info("No assessments match your criteria. Try adjusting your filters.")
-                    
-                    for i, assessment in enumerate(results, 1):
-                        with st.container():
-                            st.markdown(f"""
-                            <div class="assessment-card">
-                                <div class="assessment-title">{i}. {assessment['name']}</div>
-                                <div class="assessment-metadata">
-                                    <span class="badge">Length: {assessment['assessment_length']} min</span>
-                                    <span class="badge {'yes-badge' if assessment['remote_testing'] == 'Yes' else 'no-badge'}">
-                                        Remote Testing: {assessment['remote_testing']}
-                                    </span>
-                                    <span class="badge {'yes-badge' if assessment['adaptive_irt'] == 'Yes' else 'no-badge'}">
-                                        Adaptive: {assessment['adaptive_irt']}
-                                    </span>
-                                    <span class="badge">Type: {assessment['test_type']}</span>
-                                </div>
-                                <div class="assessment-description">
-                                    {assessment['description'][:300]}{"..." if len(assessment['description']) > 300 else ""}
-                                </div>
-                                <div style="margin-top: 10px;">
-                                    <a href="{assessment['url']}" target="_blank">View in SHL Catalog →</a>
-                                </div>
-                            </div>
-                            """, unsafe_allow_html=True)
+                        display_results(results)
                 
                 except Exception as e:
                     st.error(f"Error getting recommendations: {e}")
     
     # Show sample data
     with st.expander("Sample Assessment Data"):
-        df = pd.DataFrame(SAMPLE_ASSESSMENTS)
+        # description_short is a display copy of description, not catalogue data
+        df = pd.DataFrame(SAMPLE_COLUMNS).drop(columns="description_short")
         st.dataframe(df)
 
 if __name__ == "__main__":
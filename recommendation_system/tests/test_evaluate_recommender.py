@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+# Add the recommendation_system directory to path so we can import our modules
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from evaluate_recommender import get_hits_at_k, calculate_recall_at_k, calculate_map_at_k
+
+def _retrieved(*names):
+    return [{'name': name} for name in names]
+
+def test_duplicate_retrieved_names_count_once():
+    hits = get_hits_at_k(['A'], _retrieved('A', 'A', 'B'), k=3)
+    
+    assert hits.tolist() == [1, 0, 0]
+    assert calculate_recall_at_k(hits, 1) == 1.0
+    assert calculate_map_at_k(hits, 1, 3) == 1.0
+
+def test_duplicates_do_not_inflate_map():
+    hits = get_hits_at_k(['A', 'B'], _retrieved('C', 'A', 'A', 'B'), k=4)
+    
+    assert hits.tolist() == [0, 1, 0, 1]
+    assert calculate_recall_at_k(hits, 2) == 1.0
+    assert calculate_map_at_k(hits, 2, 4) == (1 / 2 + 2 / 4) / 2
+
+def test_hits_are_cut_at_k():
+    hits = get_hits_at_k(['B'], _retrieved('A', 'B'), k=1)
+    
+    assert hits.tolist() == [0]
+    assert calculate_recall_at_k(hits, 1) == 0.0
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+# Add the recommendation_system directory to path so we can import our modules
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from models.recommender import BaseRecommender
+from utils.vector_store import QdrantVectorStore
+
+def _conditions(filters):
+    query_filter = QdrantVectorStore._build_filter(None, filters)
+    return {condition.key: condition.match for condition in query_filter.must}
+
+def test_string_test_type_is_one_value():
+    query_filter = BaseRecommender._prepare_filters(None, test_types="Knowledge & Skills")
+    
+    assert _conditions(query_filter)["test_type"].any == ["Knowledge & Skills"]
+
+def test_list_test_types():
+    query_filter = BaseRecommender._prepare_filters(None, remote_testing="Yes",
+                                                    test_types=["Competencies", "Simulations"])
+    conditions = _conditions(query_filter)
+    
+    assert conditions["test_type"].any == ["Competencies", "Simulations"]
+    assert conditions["remote_testing"].value == "Yes"
+
+def test_no_filters():
+    assert BaseRecommender._prepare_filters(None) == {}
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+# Add the recommendation_system directory to path so we can import our modules
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from utils.semantic_cache import SemanticCache
+
+def _results(n):
+    return [{"name": f"Assessment {i}"} for i in range(n)]
+
+def test_larger_top_k_replaces_smaller_entry():
+    cache = SemanticCache(maxsize=8)
+    vector = np.random.default_rng(0).standard_normal(64)
+    key = cache.make_key(False, {})
+    cache.put(vector, key, 5, _results(5))
+
+    assert cache.get(vector, key, 10) is None
+    cache.put(vector, key, 10, _results(10))
+
+    assert len(cache.get(vector, key, 10)) == 10
+    assert len(cache.get(vector, key, 5)) == 5
+    assert cache._size == 1
+
+def test_different_keys_keep_separate_entries():
+    cache = SemanticCache(maxsize=8)
+    vector = np.random.default_rng(1).standard_normal(64)
+    cache.put(vector, cache.make_key(False, {}), 5, _results(5))
+    cache.put(vector, cache.make_key(True, {}), 5, _results(3))
+
+    assert cache._size == 2
+    assert len(cache.get(vector, cache.make_key(True, {}), 3)) == 3
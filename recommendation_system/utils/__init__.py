@@ -1,7 +1,10 @@
 # Utils package initialization
-from . import data_processor
-from . import vectorize
-from . import vector_store
-from . import api_key_loader
+import importlib
 
-__all__ = ['data_processor', 'vectorize', 'vector_store', 'api_key_loader'] 
\ No newline at end of file
+__all__ = ['data_processor', 'vectorize', 'vector_store', 'api_key_loader', 'semantic_cache']
+
+def __getattr__(name):
+    # Submodules load on first use, so the API doesn't import pandas through data_processor
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,19 @@
 import os
-import streamlit as st
+from functools import lru_cache
+from typing import Optional
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    # HTTP/2 needs the h2 package (httpx[http2]); fall back to pooled HTTP/1.1
+    HTTP2_AVAILABLE = False
+
+# Connection pool limits for OpenAI API clients
+OPENAI_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+OPENAI_HTTP_TIMEOUT = 30.0
 
 def load_openai_api_key():
     """
@@ -15,9 +29,63 @@ def load_openai_api_key():
         api_key = os.environ["OPENAI_API_KEY"]
     
     # Then try Streamlit secrets
-    if api_key is None and hasattr(st, 'secrets') and "OPENAI_API_KEY" in st.secrets:
-        api_key = st.secrets["OPENAI_API_KEY"]
-        # Also set in environment for libraries that expect it there
-        os.environ["OPENAI_API_KEY"] = api_key
+    if api_key is None:
+        try:
+            import streamlit as st
+        except ImportError:
+            return None
+        
+        if hasattr(st, 'secrets') and "OPENAI_API_KEY" in st.secrets:
+            api_key = st.secrets["OPENAI_API_KEY"]
+            # Also set in environment for libraries that expect it there
+            os.environ["OPENAI_API_KEY"] = api_key
+    
+    return api_key
+
+@lru_cache(maxsize=1)
+def load_env() -> Optional[str]:
+    """
+    Load the .env file and the OpenAI API key once per process
+    
+    Streamlit reruns scripts on every interaction; memoizing this keeps the
+    .env read and secrets lookup off that path.
     
-    return api_key 
\ No newline at end of file
+    Returns:
+        The OpenAI API key if found, None otherwise
+    """
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    
+    return load_openai_api_key()
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """
+    Get the shared OpenAI client, created on first use after the environment is loaded
+    
+    The client keeps a pool of keep-alive connections, so repeated calls skip
+    the TLS handshake.
+    
+    Returns:
+        OpenAI client instance
+    """
+    http_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=OPENAI_HTTP_LIMITS,
+                               timeout=OPENAI_HTTP_TIMEOUT)
+    return OpenAI(api_key=load_env(), http_client=http_client)
+
+def make_async_openai_client() -> AsyncOpenAI:
+    """
+    Create an AsyncOpenAI client with a pooled HTTP transport
+    
+    Async connections are bound to the event loop that opened them, so use
+    one client per loop, e.g. `async with make_async_openai_client() as client:`.
+    
+    Returns:
+        AsyncOpenAI client instance
+    """
+    http_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=OPENAI_HTTP_LIMITS,
+                                    timeout=OPENAI_HTTP_TIMEOUT)
+    return AsyncOpenAI(api_key=load_env(), http_client=http_client)
@@ -3,6 +3,9 @@ import os
 import re
 from typing import List, Dict, Any
 
+# Whitespace runs collapsed by clean_text, compiled once for ingestion loops
+_WS_RE = re.compile(r'\s+')
+
 def clean_text(text):
     """Clean and normalize text"""
     if not isinstance(text, str):
@@ -12,7 +15,7 @@ def clean_text(text):
     text = text.replace('\n', ' ')
     
     # Replace multiple spaces with a single space
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     
     # Remove special characters and lowercase
     text = text.lower()
@@ -36,13 +39,15 @@ def prepare_assessment_data(data_file: str) -> pd.DataFrame:
     df = df.fillna('')
     
     # Combine relevant features into a single text field for embedding
-    df['combined_text'] = (
-        df['name'] + '. ' + 
-        df['category'] + '. ' + 
-        df['description'] + '. ' + 
-        'Job levels: ' + df['job_levels'] + '. ' +
-        'Test type: ' + df['test_type'] + '.'
-    )
+    df['combined_text'] = df['name'].str.cat(
+        [
+            df['category'],
+            df['description'],
+            'Job levels: ' + df['job_levels'],
+            'Test type: ' + df['test_type']
+        ],
+        sep='. '
+    ) + '.'
     
     # Ensure all columns have proper data types
     df['remote_testing'] = df['remote_testing'].astype(str)
@@ -50,6 +55,35 @@ def prepare_assessment_data(data_file: str) -> pd.DataFrame:
     
     return df
 
+def load_display_data(data_file: str, columns: List[str]) -> pd.DataFrame:
+    """
+    Load selected assessment columns for display
+    
+    The CSV is converted once to a Snappy-compressed Parquet file next to it;
+    later loads read only the requested columns from the Parquet file.
+    
+    Args:
+        data_file: Path to the CSV file containing assessment data
+        columns: Columns to load
+        
+    Returns:
+        DataFrame with the requested columns
+    """
+    parquet_file = os.path.splitext(data_file)[0] + ".parquet"
+    
+    # Reuse the Parquet copy unless the CSV has changed since it was written
+    if os.path.exists(parquet_file) and os.path.getmtime(parquet_file) >= os.path.getmtime(data_file):
+        return pd.read_parquet(parquet_file, columns=columns, dtype_backend="pyarrow")
+    
+    df = pd.read_csv(data_file, engine="pyarrow", dtype_backend="pyarrow")
+    try:
+        df.to_parquet(parquet_file, compression="snappy", index=False)
+    except OSError as e:
+        # Read-only deployments just parse the CSV every time
+        print(f"Could not write {parquet_file}: {e}")
+    
+    return df[columns]
+
 def create_assessment_payloads(df: pd.DataFrame) -> List[Dict[str, Any]]:
     """
     Create payload dictionaries for each assessment
@@ -60,29 +94,31 @@ def create_assessment_payloads(df: pd.DataFrame) -> List[Dict[str, Any]]:
     Returns:
         List of payload dictionaries
     """
-    payloads = []
-    
     columns_to_include = [
         'name', 'category', 'description', 'job_levels', 
         'languages', 'assessment_length', 'remote_testing', 
-        'adaptive_irt', 'test_type', 'url'
+        'adaptive_irt', 'test_type', 'url', 'content_hash'
     ]
     
-    for _, row in df.iterrows():
-        payload = {}
-        
-        # Include all relevant columns in the payload
-        for col in columns_to_include:
-            if col in row:
-                payload[col] = row[col]
-        
-        # Process test_type to handle multiple types
-        if 'test_type' in payload and isinstance(payload['test_type'], str):
-            # Split test types if they're comma separated
-            test_types = [t.strip() for t in payload['test_type'].split(',')]
-            payload['test_type'] = test_types[0] if len(test_types) == 1 else test_types
-        
-        payloads.append(payload)
+    # Materialize one payload per row in a single pass, keeping only columns that exist
+    payloads = df[[col for col in columns_to_include if col in df.columns]].to_dict(orient="records")
+    
+    # Split comma separated test types, keeping a single type as a plain string
+    if 'test_type' in df.columns:
+        split_types = [
+            [t.strip() for t in value.split(',')] if isinstance(value, str) else None
+            for value in df['test_type']
+        ]
+        for payload, test_types in zip(payloads, split_types):
+            if test_types is not None:
+                payload['test_type'] = test_types[0] if len(test_types) == 1 else test_types
+    
+    # Precompute the truncated description shown on result cards
+    if 'description' in df.columns:
+        descriptions = df['description'].astype(str)
+        short = descriptions.where(descriptions.str.len() <= 300, descriptions.str.slice(0, 300) + "...")
+        for payload, description_short in zip(payloads, short):
+            payload['description_short'] = description_short
     
     return payloads
 
@@ -0,0 +1,40 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional; without it the kernels run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+@njit(cache=True)
+def map_at_k(hits: np.ndarray, num_relevant: int, k: int) -> float:
+    """
+    Average precision at K over a prebuilt hit array
+
+    Args:
+        hits: int8 array with 1 where the retrieved item at that rank is relevant
+        num_relevant: Number of relevant items for the query
+        k: The K value for MAP@K
+
+    Returns:
+        MAP@K score
+    """
+    if num_relevant == 0:
+        return 0.0
+
+    precision_sum = 0.0
+    num_hits = 0
+    n = min(hits.shape[0], k)
+
+    for i in range(n):
+        if hits[i]:
+            num_hits += 1
+            precision_sum += num_hits / (i + 1)
+
+    if num_hits == 0:
+        return 0.0
+
+    return precision_sum / min(num_relevant, k)
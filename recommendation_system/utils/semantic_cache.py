@@ -0,0 +1,188 @@
+import json
+import time
+import threading
+from typing import Dict, List, Optional, Any
+import numpy as np
+
+try:
+    import simsimd
+except ImportError:
+    # SimSIMD is optional; without it lookups use a NumPy int8 matmul
+    simsimd = None
+
+class SemanticCache:
+    """
+    In-process cache of recommendation results keyed by query embedding
+
+    Cached vectors are L2-normalized once at insert, so cosine similarity
+    reduces to a dot product. Rows are stored as int8 with a per-row scale
+    (a quarter of the float32 footprint), and a lookup is a single int8
+    matrix-vector product followed by an argmax, using SimSIMD's kernels
+    when it is installed. The default threshold is a
+    little lower than the float threshold to absorb quantization error.
+    """
+
+    def __init__(self, maxsize: int = 512, threshold: float = 0.93, ttl: float = 3600):
+        """
+        Initialize the semantic cache
+
+        Args:
+            maxsize: Maximum number of cached queries
+            threshold: Minimum cosine similarity for a cached query to count as a hit
+            ttl: Seconds before a cached entry expires
+        """
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+
+        # Quantized query vectors, allocated on first insert once the dimension is known
+        self._vectors = None
+        # Parallel per-slot metadata
+        self._scales = np.zeros(maxsize, dtype=np.float32)
+        self._keys = np.zeros(maxsize, dtype=np.int64)
+        self._expires = np.zeros(maxsize, dtype=np.float64)
+        self._last_used = np.zeros(maxsize, dtype=np.float64)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * maxsize
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(enhanced: bool = False, filters: Any = None) -> int:
+        """
+        Build the cache key for a set of query options
+
+        Args:
+            enhanced: Whether enhanced query processing is used
+            filters: Filters and any other options that change the results (JSON-serializable)
+
+        Returns:
+            Integer key; only entries with the same key can match each other
+        """
+        return hash(json.dumps([enhanced, filters or {}], sort_keys=True, default=str))
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        """Return the L2-normalized float32 vector, or None for a zero vector"""
+        v = np.array(vector, dtype=np.float32)
+        if not v.any():
+            # Zero vectors come from failed embedding calls and must not be cached
+            return None
+        v /= np.sqrt(v.dot(v)) + 1e-12
+        return v
+
+    @staticmethod
+    def _quantize(v: np.ndarray):
+        """Quantize a vector to int8, returning (int8 vector, scale)"""
+        scale = float(np.abs(v).max()) / 127
+        return np.round(v / scale).astype(np.int8), scale
+
+    def _similarities(self, q_i8: np.ndarray, q_scale: float, key: int, now: float) -> np.ndarray:
+        """
+        Cosine similarity of a quantized query to every cached slot
+
+        Slots with a different key or that have expired score -inf. Callers
+        must hold the lock and have checked the cache is non-empty.
+        """
+        n = self._size
+        if simsimd is not None:
+            # SIMD int8 cosine kernel; cosine ignores the per-row scales
+            sims = 1.0 - np.asarray(simsimd.cdist(q_i8[None, :], self._vectors[:n], metric="cosine"))[0]
+        else:
+            # Rows and q are unit-norm, so the rescaled int8 dot product approximates
+            # cosine similarity; accumulate in int32 to avoid overflow
+            dots = np.matmul(self._vectors[:n], q_i8, dtype=np.int32)
+            sims = dots.astype(np.float32) * self._scales[:n] * q_scale
+        # Only entries with the same options that have not expired can match
+        sims[(self._keys[:n] != key) | (self._expires[:n] < now)] = -np.inf
+        return sims
+
+    def get(self, vector, key: int, top_k: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Look up cached results for a query embedding
+
+        Args:
+            vector: The query embedding vector
+            key: Cache key from make_key
+            top_k: Number of recommendations requested
+
+        Returns:
+            List of cached recommendations, or None on a miss
+        """
+        q = self._normalize(vector)
+        if q is None:
+            return None
+        q_i8, q_scale = self._quantize(q)
+
+        with self._lock:
+            n = self._size
+            if n == 0 or self._vectors is None or self._vectors.shape[1] != q.shape[0]:
+                return None
+
+            now = time.monotonic()
+            sims = self._similarities(q_i8, q_scale, key, now)
+
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+
+            entry = self._entries[best]
+            # A hit needs enough cached results to serve top_k
+            if entry["top_k"] < top_k and len(entry["results"]) >= entry["top_k"]:
+                return None
+
+            self._last_used[best] = now
+            return [dict(result) for result in entry["results"][:top_k]]
+
+    def put(self, vector, key: int, top_k: int, results: List[Dict[str, Any]]) -> None:
+        """
+        Store results for a query embedding
+
+        Args:
+            vector: The query embedding vector
+            key: Cache key from make_key
+            top_k: Number of recommendations that were requested
+            results: The recommendations to cache
+        """
+        q = self._normalize(vector)
+        if q is None:
+            return
+        q_i8, q_scale = self._quantize(q)
+
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != q.shape[0]:
+                self._vectors = np.zeros((self.maxsize, q.shape[0]), dtype=np.int8)
+                self._size = 0
+
+            now = time.monotonic()
+            # A query that would hit an existing entry replaces it, so a larger
+            # top_k supersedes the smaller cached result instead of duplicating it
+            slot = None
+            if self._size:
+                sims = self._similarities(q_i8, q_scale, key, now)
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    slot = best
+
+            if slot is None and self._size < self.maxsize:
+                slot = self._size
+                self._size += 1
+            elif slot is None:
+                # Evict an expired entry if there is one, otherwise the least recently used
+                last_used = np.where(self._expires < now, -np.inf, self._last_used)
+                slot = int(np.argmin(last_used))
+
+            self._vectors[slot] = q_i8
+            self._scales[slot] = q_scale
+            self._keys[slot] = key
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._entries[slot] = {
+                "top_k": top_k,
+                "results": [dict(result) for result in results]
+            }
+
+    def clear(self) -> None:
+        """Remove all cached entries"""
+        with self._lock:
+            self._entries = [None] * self.maxsize
+            self._size = 0
@@ -1,22 +1,86 @@
 import os
-from typing import List, Dict, Optional, Any, Union
+import sys
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List, Dict, Optional, Any, Tuple, Union
 from pathlib import Path
+import httpx
 import numpy as np
-import streamlit as st
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.models import Filter, FieldCondition, MatchValue, MatchAny
+from utils.vectorize import EMBEDDING_DIMENSIONS
+
+# Qdrant's default indexing threshold (in KB of vectors per segment), restored after bulk loads
+DEFAULT_INDEXING_THRESHOLD = 20000
+
+# HNSW graph degree, build-time and search-time candidate list sizes; the
+# environment variables allow experimenting without code changes
+DEFAULT_HNSW_M = int(os.environ.get("QDRANT_HNSW_M", 24))
+DEFAULT_HNSW_EF_CONSTRUCT = int(os.environ.get("QDRANT_HNSW_EF_CONSTRUCT", 128))
+DEFAULT_HNSW_EF_SEARCH = int(os.environ.get("QDRANT_HNSW_EF_SEARCH", 100))
+
+# Payload fields kept for the build pipeline and UI, left out of full-payload search results
+INTERNAL_PAYLOAD_FIELDS = ["content_hash", "description_short"]
+
+def _payload_selector(with_payload: Union[bool, List[str]]):
+    """Translate with_payload=True into a selector that drops INTERNAL_PAYLOAD_FIELDS"""
+    if with_payload is True:
+        return models.PayloadSelectorExclude(exclude=INTERNAL_PAYLOAD_FIELDS)
+    return with_payload
+
+def _unit_rows(vectors: Union[np.ndarray, List[List[float]]]) -> np.ndarray:
+    """
+    Return vectors as a float32 array of L2-normalized rows
+    
+    Collections use dot-product distance, which only ranks like cosine for unit
+    vectors. This is the single place vectors are normalized, both when they
+    are stored and when they are searched for. Zero rows are left as they are.
+    """
+    array = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(array, axis=1, keepdims=True)
+    return array / np.where(norms > 0, norms, 1.0)
+
+def _streamlit_qdrant_secrets() -> Tuple[Optional[str], Optional[str]]:
+    """
+    Read the Qdrant Cloud credentials from Streamlit secrets
+    
+    Secrets only exist inside a running Streamlit app, which has already
+    imported streamlit; other processes (like the FastAPI server) never pay
+    for importing it here.
+    
+    Returns:
+        Tuple of (url, api_key), or (None, None) if they are not configured
+    """
+    st = sys.modules.get("streamlit")
+    if st is not None and hasattr(st, 'secrets') and "QDRANT_URL" in st.secrets and "QDRANT_API_KEY" in st.secrets:
+        return st.secrets["QDRANT_URL"], st.secrets["QDRANT_API_KEY"]
+    return None, None
 
 class QdrantVectorStore:
     """Vector store implementation using Qdrant"""
     
-    def __init__(self, collection_name: str = "shl_assessments", vector_size: int = 1536):
+    def __init__(self, collection_name: str = "shl_assessments", vector_size: int = EMBEDDING_DIMENSIONS,
+                 prefer_grpc: bool = True, pool_size: int = 32, m: int = DEFAULT_HNSW_M,
+                 ef_construct: int = DEFAULT_HNSW_EF_CONSTRUCT, ef_search: int = DEFAULT_HNSW_EF_SEARCH,
+                 recreate_on_mismatch: bool = False):
         """
         Initialize the Qdrant vector store
         
+        The client is created once and reused for every request; it is safe to
+        share across threads.
+        
         Args:
             collection_name: Name of the collection to use
             vector_size: Size of the embedding vectors
+            prefer_grpc: Talk to Qdrant Cloud over gRPC instead of REST
+            pool_size: Maximum number of pooled REST connections to Qdrant Cloud
+                (gRPC multiplexes concurrent calls over a single channel)
+            m: Edges per node in the HNSW graph of a new collection
+            ef_construct: Candidate list size while building the HNSW graph of a new collection
+            ef_search: Default candidate list size for searches
+            recreate_on_mismatch: Delete and recreate an existing collection whose vector size
+                differs from vector_size; otherwise a mismatch raises ValueError
         """
         # Try to get Qdrant Cloud credentials from environment or secrets
         qdrant_url = None
@@ -27,16 +91,17 @@ class QdrantVectorStore:
             qdrant_url = os.environ["QDRANT_URL"]
             qdrant_api_key = os.environ["QDRANT_API_KEY"]
         # Check Streamlit secrets
-        elif hasattr(st, 'secrets') and "QDRANT_URL" in st.secrets and "QDRANT_API_KEY" in st.secrets:
-            qdrant_url = st.secrets["QDRANT_URL"]
-            qdrant_api_key = st.secrets["QDRANT_API_KEY"]
+        else:
+            qdrant_url, qdrant_api_key = _streamlit_qdrant_secrets()
         
         # Initialize Qdrant client - cloud if credentials exist, local otherwise
         if qdrant_url and qdrant_api_key:
             # Connect to Qdrant Cloud
             self.client = QdrantClient(
                 url=qdrant_url,
-                api_key=qdrant_api_key
+                api_key=qdrant_api_key,
+                prefer_grpc=prefer_grpc,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
             )
             self.using_cloud = True
             print("Using Qdrant Cloud for vector storage")
@@ -50,61 +115,266 @@ class QdrantVectorStore:
         
         self.collection_name = collection_name
         self.vector_size = vector_size
+        self.m = m
+        self.ef_construct = ef_construct
+        self.ef_search = ef_search
         
         # Create collection if it doesn't exist
         try:
-            self.client.get_collection(collection_name=collection_name)
+            collection = self.client.get_collection(collection_name=collection_name)
         except Exception:
-            self.client.create_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=vector_size,
-                    distance=models.Distance.COSINE
+            self._create_collection()
+        else:
+            # A collection's vector size is fixed, so one built for another
+            # embedding model has to be recreated (and re-embedded). That wipes
+            # it, so only the build pipeline may do it, and only when asked to.
+            existing_size = getattr(collection.config.params.vectors, "size", vector_size)
+            if existing_size != vector_size and not recreate_on_mismatch:
+                raise ValueError(
+                    f"Collection '{collection_name}' holds {existing_size}-d vectors, expected "
+                    f"{vector_size}. Rebuild it with build_embeddings.py --recreate-collection."
                 )
+            elif existing_size != vector_size:
+                print(f"Collection '{collection_name}' holds {existing_size}-d vectors, expected "
+                      f"{vector_size}; recreating it.")
+                self.client.delete_collection(collection_name=collection_name)
+                self._create_collection()
+            elif isinstance(collection.config.quantization_config, models.BinaryQuantization):
+                # Collections from before the switch to int8 are requantized in place
+                self.client.update_collection(
+                    collection_name=collection_name,
+                    quantization_config=self._quantization_config()
+                )
+    
+    def _create_collection(self) -> None:
+        """Create the collection for unit-normalized vectors of self.vector_size"""
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            # Vectors are unit-normalized on the way in (see _unit_rows), so a plain
+            # dot product ranks the same as cosine without per-vector normalization
+            vectors_config=models.VectorParams(
+                size=self.vector_size,
+                distance=models.Distance.DOT
+            ),
+            # Denser graph than Qdrant's defaults (m=16, ef_construct=100) for better recall
+            hnsw_config=models.HnswConfigDiff(m=self.m, ef_construct=self.ef_construct, on_disk=False),
+            quantization_config=self._quantization_config()
+        )
+    
+    def _quantization_config(self) -> models.ScalarQuantization:
+        """
+        Int8 scalar quantization for the collection
+        
+        The int8 codes are a quarter the size of the float32 vectors and stay in
+        RAM for the HNSW probes; full vectors are only read to rescore. Unlike
+        1-bit binary codes, int8 keeps its recall on 512-d embeddings.
+        """
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+    
+    def warmup(self) -> None:
+        """
+        Run one throwaway search so the connection is open and the index is
+        paged in before the first real query
+        """
+        probe = [0.0] * self.vector_size
+        probe[0] = 1.0
+        try:
+            self.client.query_points(
+                collection_name=self.collection_name,
+                query=probe,
+                limit=1
             )
+        except Exception as e:
+            print(f"Vector store warmup failed: {e}")
     
-    def add_vectors(self, vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> None:
+    def add_vectors(self, vectors: List[List[float]], payloads: List[Dict[str, Any]],
+                    ids: Optional[List[int]] = None, batch_size: int = 256,
+                    wait: bool = True) -> None:
         """
         Add vectors and their payloads to the collection
         
+        Points are upserted in batches of batch_size. Only the last batch waits
+        for the server to apply it; updates are applied in order, so that also
+        covers the earlier batches.
+        
         Args:
             vectors: List of embedding vectors
             payloads: List of payloads (metadata) for each vector
+            ids: Point IDs for the vectors (defaults to 0..N-1)
+            batch_size: Number of points per upsert request
+            wait: Whether to wait for the last upsert to be applied
         """
-        # Convert vectors to numpy array for validation
-        vectors_np = np.array(vectors)
+        if ids is None:
+            ids = list(range(len(vectors)))
         
-        # Validate the vector dimensions
-        if vectors_np.shape[1] != self.vector_size:
+        # Validate the vector dimensions from the first vector, without copying the rest
+        if len(vectors) and len(vectors[0]) != self.vector_size:
             raise ValueError(
-                f"Vector size mismatch. Expected {self.vector_size}, got {vectors_np.shape[1]}"
+                f"Vector size mismatch. Expected {self.vector_size}, got {len(vectors[0])}"
             )
         
-        # Create points to add
-        points = [
-            models.PointStruct(
-                id=i,
-                vector=vector if isinstance(vector, list) else vector.tolist(),
-                payload=payload
+        ids = list(ids)
+        
+        # Send columnar batches rather than one PointStruct per point, which
+        # skips a pydantic model (and its validation) for every vector. Each
+        # batch is normalized as it is sent, so the input is never copied whole.
+        for start in range(0, len(vectors), batch_size):
+            end = start + batch_size
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=models.Batch(
+                    ids=ids[start:end],
+                    vectors=_unit_rows(vectors[start:end]),
+                    payloads=payloads[start:end]
+                ),
+                wait=wait and end >= len(vectors)
             )
-            for i, (vector, payload) in enumerate(zip(vectors, payloads))
-        ]
+    
+    def overwrite_payloads(self, payloads: List[Dict[str, Any]], ids: List[int],
+                           batch_size: int = 256, wait: bool = True) -> None:
+        """
+        Replace the payloads of existing points without re-sending their vectors
+        
+        Args:
+            payloads: New payload for each point
+            ids: IDs of the points to update
+            batch_size: Number of points per update request
+            wait: Whether to wait for the last update to be applied
+        """
+        ids = list(ids)
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            operations = [
+                models.OverwritePayloadOperation(
+                    overwrite_payload=models.SetPayload(payload=payload, points=[point_id])
+                )
+                for point_id, payload in zip(ids[start:end], payloads[start:end])
+            ]
+            self.client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=operations,
+                wait=wait and end >= len(ids)
+            )
+    
+    def get_content_hashes(self, batch_size: int = 1024) -> Dict[Any, str]:
+        """
+        Map the ID of every stored point to the content_hash in its payload
+        
+        Args:
+            batch_size: Number of points fetched per scroll request
+            
+        Returns:
+            Dictionary of point ID to content hash, for points that have one
+        """
+        hashes = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=["content_hash"],
+                with_vectors=False
+            )
+            for point in points:
+                if point.payload and "content_hash" in point.payload:
+                    hashes[point.id] = point.payload["content_hash"]
+            if offset is None:
+                return hashes
+    
+    @contextmanager
+    def indexing_paused(self):
+        """
+        Turn off HNSW indexing for the duration of a bulk load
         
-        # Add points to the collection
-        self.client.upsert(
+        Without this the graph is rebuilt incrementally as segments fill up;
+        with it, the index is built once when the threshold is restored.
+        The embedded local client ignores optimizer settings.
+        """
+        self.client.update_collection(
             collection_name=self.collection_name,
-            points=points
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0)
+        )
+        try:
+            yield
+        finally:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                optimizers_config=models.OptimizersConfigDiff(indexing_threshold=DEFAULT_INDEXING_THRESHOLD)
+            )
+    
+    def bulk_load(self, vectors: Union[np.ndarray, List[List[float]]], payloads: List[Dict[str, Any]],
+                  ids: Optional[List[int]] = None, batch_size: int = 256) -> None:
+        """
+        Upload a whole collection's worth of vectors with indexing paused
+        
+        Args:
+            vectors: Embedding vectors, as an array or list of lists
+            payloads: List of payloads (metadata) for each vector
+            ids: Point IDs for the vectors (defaults to 0..N-1)
+            batch_size: Number of points per upload request
+        """
+        with self.indexing_paused():
+            self.upload_vectors(vectors, payloads, ids=ids, batch_size=batch_size)
+    
+    def upload_vectors(self, vectors: Union[np.ndarray, List[List[float]]], payloads: List[Dict[str, Any]],
+                       ids: Optional[List[int]] = None, batch_size: int = 256,
+                       parallel: Optional[int] = None) -> None:
+        """
+        Bulk load vectors and payloads with the client's uploader
+        
+        Meant for initial loads of a whole collection: batches are streamed by
+        the client, using several worker processes against Qdrant Cloud.
+        
+        Args:
+            vectors: Embedding vectors, as an array or list of lists
+            payloads: List of payloads (metadata) for each vector
+            ids: Point IDs for the vectors (defaults to 0..N-1)
+            batch_size: Number of points per upload request
+            parallel: Number of upload processes (CPU count for Qdrant Cloud, 1 locally)
+        """
+        vectors_np = np.asarray(vectors, dtype=np.float32)
+        if vectors_np.ndim != 2 or vectors_np.shape[1] != self.vector_size:
+            raise ValueError(
+                f"Vector size mismatch. Expected {self.vector_size}, got {vectors_np.shape[-1]}"
+            )
+        vectors_np = _unit_rows(vectors_np)
+        
+        # The embedded local client can't be shared with worker processes
+        if parallel is None:
+            parallel = (os.cpu_count() or 1) if self.using_cloud else 1
+        
+        self.client.upload_collection(
+            collection_name=self.collection_name,
+            vectors=vectors_np,
+            payload=payloads,
+            ids=list(ids) if ids is not None else list(range(len(vectors_np))),
+            batch_size=batch_size,
+            parallel=parallel,
+            wait=True
         )
     
     def search(self, query_vector: List[float], limit: int = 10, 
-               filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+               filters: Optional[Dict[str, Any]] = None, hnsw_ef: Optional[int] = None,
+               oversampling: float = 2.0, rescore: bool = True,
+               with_payload: Union[bool, List[str]] = True) -> List[Dict[str, Any]]:
         """
         Search for similar vectors
         
         Args:
             query_vector: The query embedding vector
             limit: Maximum number of results to return
-            filters: Dictionary of filters to apply
+            filters: Dictionary of filters, or a prebuilt Qdrant Filter, to apply
+            hnsw_ef: Size of the HNSW candidate list, ef_search if None (higher is more accurate but slower)
+            oversampling: Candidates fetched per result from the quantized index
+            rescore: Whether to rescore the candidates with the full vectors
+            with_payload: True for the payload without INTERNAL_PAYLOAD_FIELDS, or the list of payload fields to return
             
         Returns:
             List of assessment dictionaries
@@ -112,20 +382,95 @@ class QdrantVectorStore:
         # Prepare search conditions
         search_params = {
             "collection_name": self.collection_name,
-            "query_vector": query_vector,
+            "query": _unit_rows(query_vector)[0].tolist(),
             "limit": limit,
-            "with_payload": True
+            "with_payload": _payload_selector(with_payload),
+            "search_params": self._search_params(hnsw_ef, oversampling, rescore)
         }
         
         # Add filters if provided
-        if filters and len(filters) > 0:
-            qdrant_filter = self._build_filter(filters)
-            search_params["query_filter"] = qdrant_filter
+        if filters:
+            search_params["query_filter"] = self._to_filter(filters)
+        
+        # Perform search through the Query API (client.search is deprecated)
+        response = self.client.query_points(**search_params)
+        
+        return self._format_results(response.points)
+    
+    def search_batch(self, query_vectors: List[List[float]], limit: int = 10,
+                     filters: Optional[Dict[str, Any]] = None, hnsw_ef: Optional[int] = None,
+                     oversampling: float = 2.0, rescore: bool = True,
+                     with_payload: Union[bool, List[str]] = True) -> List[List[Dict[str, Any]]]:
+        """
+        Search for similar vectors for several queries in one request
+        
+        Args:
+            query_vectors: List of query embedding vectors
+            limit: Maximum number of results to return per query
+            filters: Dictionary of filters, or a prebuilt Qdrant Filter, to apply to every query
+            hnsw_ef: Size of the HNSW candidate list, ef_search if None (higher is more accurate but slower)
+            oversampling: Candidates fetched per result from the quantized index
+            rescore: Whether to rescore the candidates with the full vectors
+            with_payload: True for the payload without INTERNAL_PAYLOAD_FIELDS, or the list of payload fields to return
+            
+        Returns:
+            List of assessment dictionaries for each query, in input order
+        """
+        qdrant_filter = self._to_filter(filters) if filters else None
+        search_params = self._search_params(hnsw_ef, oversampling, rescore)
+        with_payload = _payload_selector(with_payload)
+        
+        requests = [
+            models.QueryRequest(
+                query=vector,
+                filter=qdrant_filter,
+                limit=limit,
+                with_payload=with_payload,
+                params=search_params
+            )
+            for vector in (_unit_rows(query_vectors).tolist() if len(query_vectors) else [])
+        ]
+        
+        # Perform all searches in a single round-trip
+        batch_results = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=requests
+        )
+        
+        return [self._format_results(response.points) for response in batch_results]
+    
+    def _search_params(self, hnsw_ef: Optional[int], oversampling: float, rescore: bool) -> models.SearchParams:
+        """
+        Build the Qdrant search parameters
+        
+        The quantization settings are ignored by collections created without quantization.
         
-        # Perform search
-        results = self.client.search(**search_params)
+        Args:
+            hnsw_ef: Size of the HNSW candidate list (ef_search if None)
+            oversampling: Candidates fetched per result from the quantized index
+            rescore: Whether to rescore the candidates with the full vectors
+            
+        Returns:
+            Qdrant SearchParams object
+        """
+        return models.SearchParams(
+            hnsw_ef=hnsw_ef if hnsw_ef is not None else self.ef_search,
+            quantization=models.QuantizationSearchParams(
+                rescore=rescore,
+                oversampling=oversampling
+            )
+        )
+    
+    def _format_results(self, results) -> List[Dict[str, Any]]:
+        """
+        Convert scored points into assessment dictionaries
         
-        # Extract and format the results
+        Args:
+            results: Scored points returned by Qdrant
+            
+        Returns:
+            List of assessment dictionaries
+        """
         formatted_results = []
         for res in results:
             payload = res.payload.copy()
@@ -134,36 +479,61 @@ class QdrantVectorStore:
         
         return formatted_results
     
+    def _to_filter(self, filters: Union[Dict[str, Any], Filter]) -> Filter:
+        """Return filters as a Qdrant Filter, passing prebuilt filters straight through"""
+        return filters if isinstance(filters, Filter) else self._build_filter(filters)
+    
     def _build_filter(self, filters: Dict[str, Any]) -> Filter:
         """
         Build Qdrant filter from filter dictionary
         
+        Equal filter dictionaries share one memoized Filter object, so repeated
+        filter presets skip rebuilding the pydantic models on every search.
+        
         Args:
             filters: Dictionary of filters
             
         Returns:
             Qdrant Filter object
         """
-        must_conditions = []
-        
-        for key, value in filters.items():
-            if key == "test_type" and isinstance(value, list):
-                # For test types, we need to check if any of the specified types
-                # matches any in the assessment's test types
-                if len(value) > 0:
-                    must_conditions.append(
-                        FieldCondition(
-                            key=key,
-                            match=MatchAny(any=value)
-                        )
-                    )
-            else:
-                # For other filters, we need an exact match
+        key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in filters.items()))
+        try:
+            return _build_filter_cached(key)
+        except TypeError:
+            # Unhashable filter values are built without the cache
+            return _build_filter_cached.__wrapped__(key)
+
+@lru_cache(maxsize=256)
+def _build_filter_cached(items: Tuple[Tuple[str, Any], ...]) -> Filter:
+    """
+    Build the Qdrant filter for a canonical (key, value) tuple of a filter dictionary
+    
+    Args:
+        items: Sorted (key, value) pairs, with list values converted to tuples
+        
+    Returns:
+        Qdrant Filter object
+    """
+    must_conditions = []
+    
+    for key, value in items:
+        if key == "test_type" and isinstance(value, tuple):
+            # For test types, we need to check if any of the specified types
+            # matches any in the assessment's test types
+            if len(value) > 0:
                 must_conditions.append(
                     FieldCondition(
                         key=key,
-                        match=MatchValue(value=value)
+                        match=MatchAny(any=list(value))
                     )
                 )
-        
-        return Filter(must=must_conditions) 
\ No newline at end of file
+        else:
+            # For other filters, we need an exact match
+            must_conditions.append(
+                FieldCondition(
+                    key=key,
+                    match=MatchValue(value=value)
+                )
+            )
+    
+    return Filter(must=must_conditions)
@@ -1,15 +1,246 @@
 import os
-from typing import List, Union
+import io
+import base64
+import json
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import numpy as np
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
 from tqdm import tqdm
+from utils.api_key_loader import get_openai_client, make_async_openai_client
+import asyncio
 import time
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+try:
+    import diskcache
+except ImportError:
+    # diskcache is optional; without it embeddings are only cached in memory
+    diskcache = None
 
-def get_embedding(text: str, model: str = "text-embedding-ada-002") -> List[float]:
+try:
+    import tiktoken
+except ImportError:
+    # tiktoken is optional; without it long texts are truncated by word count
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Embeddings persisted across runs, keyed by sha256 of model, size and text
+EMBEDDING_CACHE_DIR = os.environ.get(
+    "EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".emb_cache")
+)
+
+# Embedding model and vector size; text-embedding-3 models return vectors
+# shortened to EMBEDDING_DIMENSIONS (Matryoshka truncation, done server side)
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 512
+
+def embedding_dimensions(model: str = EMBEDDING_MODEL) -> int:
+    """Return the vector size produced for a model"""
+    return EMBEDDING_DIMENSIONS if model.startswith("text-embedding-3") else 1536
+
+def _embedding_params(model: str) -> Dict[str, Union[int, str]]:
+    """
+    Extra embeddings request parameters for a model
+    
+    Vectors come back as base64 float32 blobs, several times smaller than JSON
+    float lists and decoded with a single np.frombuffer. Only text-embedding-3
+    models accept a vector size.
+    """
+    params = {"encoding_format": "base64"}
+    if model.startswith("text-embedding-3"):
+        params["dimensions"] = EMBEDDING_DIMENSIONS
+    return params
+
+# OpenAI embedding models have an 8191 token limit; stay a bit below it
+MAX_EMBEDDING_TOKENS = 8000
+
+@lru_cache(maxsize=4)
+def _get_encoding(model: str):
+    """Return the tiktoken encoding for a model, or None without tiktoken"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding files are downloaded on first use, which fails offline
+        logger.warning("Could not load the tiktoken encoding, truncating by words: %s", e)
+        return None
+
+def truncate_to_token_limit(text: str, model: str = EMBEDDING_MODEL,
+                            max_tokens: int = MAX_EMBEDDING_TOKENS) -> str:
+    """
+    Truncate text to the embedding model's context limit
+    
+    Tokens are counted exactly with tiktoken when it is installed, otherwise
+    words stand in for tokens.
+    
+    Args:
+        text: Text to truncate
+        model: OpenAI embedding model the text is meant for
+        max_tokens: Maximum number of tokens to keep
+        
+    Returns:
+        The text, cut to at most max_tokens tokens
+    """
+    # Every token covers at least one UTF-8 byte, and a character is at most
+    # four bytes, so short texts can't be over the limit
+    if len(text) * 4 <= max_tokens:
+        return text
+    
+    encoding = _get_encoding(model)
+    if encoding is None:
+        words = text.split()
+        return " ".join(words[:max_tokens]) if len(words) > max_tokens else text
+    
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+
+# Errors worth retrying an embedding request for; anything else fails the call
+RETRYABLE_OPENAI_ERRORS = (openai.RateLimitError, openai.APITimeoutError,
+                           openai.APIConnectionError, openai.InternalServerError)
+
+_exponential_backoff = wait_exponential(multiplier=1, min=1, max=60)
+
+def _wait_retry_after(retry_state) -> float:
+    """Wait as long as the server's Retry-After header asks, else back off exponentially"""
+    response = getattr(retry_state.outcome.exception(), "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), 60.0)
+        except (TypeError, ValueError):
+            pass
+    return _exponential_backoff(retry_state)
+
+class RateLimiter:
+    """Token bucket throttle for requests and tokens per minute"""
+    
+    def __init__(self, requests_per_minute: int = 3000, tokens_per_minute: int = 1_000_000):
+        """
+        Initialize the rate limiter with full buckets
+        
+        Args:
+            requests_per_minute: Request budget per minute
+            tokens_per_minute: Token budget per minute
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self) -> None:
+        """Top up both buckets for the time elapsed since the last refill"""
+        now = time.monotonic()
+        elapsed_minutes = (now - self._updated) / 60.0
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed_minutes * self.requests_per_minute)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed_minutes * self.tokens_per_minute)
+    
+    async def acquire(self, estimated_tokens: int) -> None:
+        """
+        Wait until one request and estimated_tokens tokens are available, then take them
+        
+        Args:
+            estimated_tokens: Tokens the request is expected to use
+        """
+        tokens = min(estimated_tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                
+                # Sleep until the scarcer bucket has refilled enough
+                wait = max((1 - self._requests) / self.requests_per_minute,
+                           (tokens - self._tokens) / self.tokens_per_minute) * 60.0
+                await asyncio.sleep(wait)
+
+@lru_cache(maxsize=1)
+def _get_disk_cache():
+    """Open the on-disk embedding cache, or return None if it's unavailable"""
+    if diskcache is None:
+        return None
+    try:
+        return diskcache.Cache(EMBEDDING_CACHE_DIR)
+    except OSError as e:
+        logger.warning("Embedding disk cache disabled: %s", e)
+        return None
+
+def content_hash(text: str, model: str = EMBEDDING_MODEL) -> str:
+    """
+    Fingerprint a text as embedded by a model
+    
+    The hash covers the model and vector size as well as the text, so
+    changing either one changes every fingerprint.
+    
+    Args:
+        text: Text to embed
+        model: OpenAI embedding model to use
+        
+    Returns:
+        Hex SHA-256 digest
+    """
+    return hashlib.sha256(f"{model}\x00{embedding_dimensions(model)}\x00{text}".encode("utf-8")).hexdigest()
+
+def _disk_cache_key(model: str, text) -> str:
+    """Return the disk cache key for a text embedded with a model"""
+    return content_hash(text, model)
+
+def _disk_cache_lookup(model: str, texts: List[str]) -> List[Optional[List[float]]]:
+    """Return the cached embedding for each text, or None where there is none"""
+    cache = _get_disk_cache()
+    if cache is None:
+        return [None] * len(texts)
+    
+    embeddings = []
+    for text in texts:
+        embedding = cache.get(_disk_cache_key(model, text))
+        embeddings.append(embedding.tolist() if embedding is not None else None)
+    return embeddings
+
+def _disk_cache_store(model: str, texts: List[str], embeddings: List[List[float]]) -> None:
+    """Persist embeddings as float32 arrays, skipping zero vectors from failed calls"""
+    cache = _get_disk_cache()
+    if cache is None:
+        return
+    
+    with cache.transact():
+        for text, embedding in zip(texts, embeddings):
+            embedding = np.asarray(embedding, dtype=np.float32)
+            if embedding.any():
+                cache.set(_disk_cache_key(model, text), embedding)
+
+def decode_embedding(embedding) -> List[float]:
+    """
+    Convert an embedding from the API response into a list of floats
+    
+    Vectors are not normalized here; QdrantVectorStore normalizes them once on
+    the way in and on every search.
+    
+    Args:
+        embedding: Embedding vector, or the base64 string returned for encoding_format="base64"
+        
+    Returns:
+        Embedding as a list of floats
+    """
+    if isinstance(embedding, str):
+        # Little-endian float32 values, base64 encoded
+        return np.frombuffer(base64.b64decode(embedding), dtype="<f4").tolist()
+    return list(embedding)
+
+def get_embedding(text: str, model: str = EMBEDDING_MODEL) -> List[float]:
     """
     Get embedding for a single text string
     
@@ -24,61 +255,267 @@ def get_embedding(text: str, model: str = "text-embedding-ada-002") -> List[floa
     if not isinstance(text, str):
         text = str(text)
     
-    # Truncate long texts to the model's context limit
-    # text-embedding-ada-002 has an 8191 token limit
-    max_tokens = 8000  # Setting a bit below the limit to be safe
-    if len(text.split()) > max_tokens:
-        text = " ".join(text.split()[:max_tokens])
+    try:
+        return list(_cached_embedding(model, text))
+    except Exception as e:
+        # Re-raise rather than return a zero vector, which would rank arbitrarily
+        logger.error("Error getting embedding: %s", e)
+        raise
+
+@lru_cache(maxsize=2048)
+def _cached_embedding(model: str, text: str) -> Tuple[float, ...]:
+    """
+    Fetch an embedding from the disk cache or the API, memoized on (model, text)
+    
+    Errors propagate so that failed calls are not cached.
+    """
+    cached = _disk_cache_lookup(model, [text])[0]
+    if cached is not None:
+        return tuple(cached)
     
+    response = get_openai_client().embeddings.create(
+        model=model,
+        input=truncate_to_token_limit(text, model),
+        **_embedding_params(model)
+    )
+    embedding = decode_embedding(response.data[0].embedding)
+    _disk_cache_store(model, [text], [embedding])
+    return tuple(embedding)
+
+def get_embeddings_batch(texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+    """
+    Get embeddings for a handful of texts with a single API request
+    
+    Meant for interactive multi-query workloads; use batch_get_embeddings for
+    bulk jobs that need splitting into several requests.
+    
+    Args:
+        texts: List of texts to embed
+        model: OpenAI embedding model to use
+        
+    Returns:
+        List of embedding vectors, in input order
+    """
+    if not texts:
+        return []
+    
+    texts = [text if isinstance(text, str) else str(text) for text in texts]
+    
+    # Only request the texts that aren't in the disk cache
+    all_embeddings = _disk_cache_lookup(model, texts)
+    missing = [i for i, embedding in enumerate(all_embeddings) if embedding is None]
+    if not missing:
+        return all_embeddings
+    
+    # Errors propagate rather than returning zero vectors that would rank arbitrarily
     try:
-        response = client.embeddings.create(
+        response = get_openai_client().embeddings.create(
             model=model,
-            input=text
+            input=[truncate_to_token_limit(texts[i], model) for i in missing],
+            **_embedding_params(model)
         )
-        return response.data[0].embedding
     except Exception as e:
-        print(f"Error getting embedding: {e}")
-        # Return a zero vector of the expected size in case of error
-        return [0.0] * 1536  # text-embedding-ada-002 produces 1536-dimensional vectors
+        logger.error("Error getting embeddings: %s", e)
+        raise
+    
+    new_embeddings = [decode_embedding(item.embedding) for item in response.data]
+    _disk_cache_store(model, [texts[i] for i in missing], new_embeddings)
+    
+    for i, embedding in zip(missing, new_embeddings):
+        all_embeddings[i] = embedding
+    return all_embeddings
 
-def batch_get_embeddings(texts: List[str], model: str = "text-embedding-ada-002", 
-                         batch_size: int = 100) -> List[List[float]]:
+def batch_get_embeddings(texts: List[str], model: str = EMBEDDING_MODEL, 
+                         batch_size: int = 100, concurrency: int = 16) -> List[List[float]]:
     """
     Get embeddings for a batch of texts
     
+    Batches are sent concurrently through abatch_get_embeddings, so the total
+    time is bounded by the slowest requests rather than the sum of all round
+    trips. Call abatch_get_embeddings directly from code already running in
+    an event loop.
+    
     Args:
         texts: List of texts to embed
         model: OpenAI embedding model to use
         batch_size: Number of texts to process in each batch
+        concurrency: Maximum number of requests in flight
         
     Returns:
         List of embedding vectors
     """
-    all_embeddings = []
+    return asyncio.run(
+        abatch_get_embeddings(texts, model, batch_size=batch_size,
+                              concurrency=concurrency, show_progress=True)
+    )
+
+async def abatch_get_embeddings(texts: List[str], model: str = EMBEDDING_MODEL,
+                                batch_size: int = 64, concurrency: int = 16,
+                                show_progress: bool = False,
+                                rate_limiter: Optional[RateLimiter] = None) -> List[List[float]]:
+    """
+    Get embeddings for a batch of texts using concurrent API requests
+    
+    Texts are sorted by length before batching so each request holds texts of
+    similar size; results are returned in the original order. Requests are
+    throttled by a token bucket and retried with backoff on rate limits and
+    transient errors; if a batch still fails the error is raised rather than
+    filling the batch with zero vectors that would corrupt an index. Texts
+    already in the disk cache are not requested again, and duplicate texts
+    are requested once.
     
-    for i in tqdm(range(0, len(texts), batch_size), desc="Generating embeddings"):
-        # Get the current batch
-        batch = texts[i:i+batch_size]
+    Args:
+        texts: List of texts to embed
+        model: OpenAI embedding model to use
+        batch_size: Number of texts to send in each request
+        concurrency: Maximum number of requests in flight
+        show_progress: Whether to show a progress bar over the batches
+        rate_limiter: Throttle shared between calls (a fresh one per call if None)
         
-        try:
-            # Get embeddings for the batch
-            response = client.embeddings.create(
-                model=model,
-                input=batch
+    Returns:
+        List of embedding vectors
+    """
+    # Serve repeated texts from the disk cache and only request the rest
+    all_embeddings = _disk_cache_lookup(model, texts)
+    missing = [i for i, embedding in enumerate(all_embeddings) if embedding is None]
+    if not missing:
+        return all_embeddings
+    
+    # Embed each distinct text once and share the result between duplicates
+    unique_positions = {}
+    inverse = [unique_positions.setdefault(texts[i], len(unique_positions)) for i in missing]
+    texts_to_embed = list(unique_positions)
+    
+    limiter = rate_limiter or RateLimiter()
+    order = np.argsort([len(text) for text in texts_to_embed], kind="stable")
+    sorted_texts = [texts_to_embed[i] for i in order]
+    semaphore = asyncio.Semaphore(concurrency)
+    starts = range(0, len(sorted_texts), batch_size)
+    progress = tqdm(total=len(starts), desc="Generating embeddings", disable=not show_progress)
+    
+    async def embed_batch(async_client: AsyncOpenAI, start: int) -> List[List[float]]:
+        # Cut long texts to the model's context limit, as get_embedding does
+        batch = [truncate_to_token_limit(text, model) for text in sorted_texts[start:start + batch_size]]
+        async with semaphore:
+            # tenacity owns the retries, so the SDK's own are turned off
+            retrying = AsyncRetrying(
+                stop=stop_after_attempt(6),
+                wait=_wait_retry_after,
+                retry=retry_if_exception_type(RETRYABLE_OPENAI_ERRORS),
+                reraise=True
             )
+            try:
+                async for attempt in retrying:
+                    with attempt:
+                        await limiter.acquire(sum(len(text) // 4 for text in batch))
+                        response = await async_client.with_options(max_retries=0).embeddings.create(
+                            model=model,
+                            input=batch,
+                            **_embedding_params(model)
+                        )
+            except Exception as e:
+                logger.error("Error in batch %d: %s", start // batch_size + 1, e)
+                raise
             
-            # Extract embeddings from the response
-            batch_embeddings = [item.embedding for item in response.data]
-            all_embeddings.extend(batch_embeddings)
-            
-            # Add a small delay to respect API rate limits
-            if i + batch_size < len(texts):
-                time.sleep(0.5)
-                
-        except Exception as e:
-            print(f"Error in batch {i//batch_size + 1}: {e}")
-            # Add zero vectors for this batch in case of error
-            zero_vector = [0.0] * 1536  # text-embedding-ada-002 produces 1536-dimensional vectors
-            all_embeddings.extend([zero_vector] * len(batch))
+            progress.update()
+            return [decode_embedding(item.embedding) for item in response.data]
+    
+    # The async client is scoped to this call so it never outlives its event loop
+    try:
+        async with make_async_openai_client() as async_client:
+            batches = await asyncio.gather(*(embed_batch(async_client, start) for start in starts))
+    finally:
+        progress.close()
+    
+    # Undo the length sort
+    new_embeddings = [None] * len(texts_to_embed)
+    sorted_embeddings = [embedding for batch in batches for embedding in batch]
+    for position, i in enumerate(order):
+        new_embeddings[i] = sorted_embeddings[position]
+    _disk_cache_store(model, texts_to_embed, new_embeddings)
+    
+    # Splice the new embeddings in among the cached ones
+    for i, j in zip(missing, inverse):
+        all_embeddings[i] = new_embeddings[j]
+    
+    return all_embeddings
+
+def batch_api_get_embeddings(texts: List[str], model: str = EMBEDDING_MODEL,
+                             poll_interval: float = 10.0,
+                             progress_callback: Optional[Callable[[str, int, int], None]] = None) -> List[List[float]]:
+    """
+    Get embeddings for a large set of texts through the OpenAI Batch API
+    
+    All texts are submitted as one JSONL batch job, which is billed at half the
+    price of synchronous requests but may take a while to complete. Blocks until
+    the job has finished. Requests that fail inside the job are re-embedded
+    through abatch_get_embeddings.
+    
+    Args:
+        texts: List of texts to embed
+        model: OpenAI embedding model to use
+        poll_interval: Seconds to wait between job status checks
+        progress_callback: Optional function called as (status, completed, total) on each poll
+        
+    Returns:
+        List of embedding vectors, in input order
+    """
+    client = get_openai_client()
+    texts = [text if isinstance(text, str) else str(text) for text in texts]
+    
+    # One embeddings request per text, tagged with its position and cut to
+    # the model's context limit
+    lines = [
+        json.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/embeddings",
+            "body": {"model": model, "input": truncate_to_token_limit(text, model),
+                     **_embedding_params(model)}
+        })
+        for i, text in enumerate(texts)
+    ]
+    batch_file = client.files.create(
+        file=("embeddings.jsonl", io.BytesIO("\n".join(lines).encode("utf-8"))),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/embeddings",
+        completion_window="24h"
+    )
+    
+    # Wait for the job to finish
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+        if progress_callback is not None:
+            counts = batch.request_counts
+            progress_callback(batch.status, counts.completed if counts else 0, len(texts))
+    
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Embedding batch {batch.id} ended with status '{batch.status}'")
+    
+    # Results come back in arbitrary order
+    all_embeddings = [None] * len(texts)
+    output = client.files.content(batch.output_file_id).text
+    for line in output.splitlines():
+        if not line:
+            continue
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if response.get("status_code") != 200:
+            logger.error("Embedding request %s failed: %s", result.get("custom_id"), result.get("error"))
+            continue
+        all_embeddings[int(result["custom_id"])] = decode_embedding(response["body"]["data"][0]["embedding"])
+    
+    # Re-embed failed requests through the regular API rather than loading
+    # zero vectors into the index; this raises if they fail again
+    failed = [i for i, embedding in enumerate(all_embeddings) if embedding is None]
+    if failed:
+        logger.warning("Re-embedding %d failed batch requests", len(failed))
+        retried = asyncio.run(abatch_get_embeddings([texts[i] for i in failed], model))
+        for i, embedding in zip(failed, retried):
+            all_embeddings[i] = embedding
     
-    return all_embeddings 
\ No newline at end of file
+    return all_embeddings
@@ -1,13 +1,25 @@
 import sys
 from pathlib import Path
 
-# Add recommendation_system to path
-sys.path.append(str(Path(__file__).resolve().parent))
+# Add recommendation_system to path; its modules (api, main, utils) import
+# each other as top-level modules
+sys.path.append(str(Path(__file__).resolve().parent / "recommendation_system"))
 
 # Import the app
-from recommendation_system.api import app
+from api import app
 
 # This file is used by gunicorn or uvicorn in production
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run("run:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    dev_mode = bool(os.environ.get("DEV"))
+    # reload is incompatible with multiple workers, so only use it in development
+    uvicorn.run(
+        "run:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        reload=dev_mode,
+        workers=1 if dev_mode else max(1, (os.cpu_count() or 1) // 2)
+    ) 
\ No newline at end of file
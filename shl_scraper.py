@@ -1,7 +1,11 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import csv
+import random
+import aiohttp
+import pyarrow as pa
+import pyarrow.parquet as pq
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
 import pandas as pd
-import time
 from typing import List, Dict
 import logging
 import re
@@ -11,7 +15,25 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class SHLScraper:
-    def __init__(self):
+    # Extracts the minutes from text like "Approximate Completion Time in minutes = 49"
+    _LENGTH_RE = re.compile(r'=\s*(\d+)')
+    # Transient failures are retried with exponential backoff (0.3s, 0.6s, 1.2s)
+    MAX_RETRIES = 3
+    RETRY_BACKOFF = 0.3
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    # Output columns, in a logical order
+    COLUMNS = ['name', 'category', 'description', 'job_levels', 'languages',
+               'assessment_length', 'remote_testing', 'adaptive_irt',
+               'test_type', 'url']
+    SCHEMA = pa.schema([(column, pa.string()) for column in COLUMNS])
+    # (type id, start of the last catalogue page, category name)
+    CATEGORIES = [
+        (1, 373, 'Individual Test Solutions'),
+        (2, 133, 'Pre-packaged Job Solutions')
+    ]
+
+    def __init__(self, max_concurrency: int = 10):
+        self.max_concurrency = max_concurrency
         self.base_url = "https://www.shl.com/solutions/products/product-catalog/"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
@@ -28,18 +50,35 @@ class SHLScraper:
             'S': 'Simulations'
         }
 
-    def _get_page_content(self, url: str) -> str:
-        """Fetch content from a URL."""
-        try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
-            logger.error(f"Error fetching URL {url}: {e}")
-            return ""
+    async def _get_page_content(self, session: aiohttp.ClientSession,
+                                semaphore: asyncio.Semaphore, url: str) -> str:
+        """Fetch content from a URL, with at most max_concurrency requests in flight."""
+        content = ""
+        async with semaphore:
+            for attempt in range(self.MAX_RETRIES + 1):
+                try:
+                    async with session.get(url) as response:
+                        response.raise_for_status()
+                        content = await response.text()
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in self.RETRY_STATUSES
+                    if not retryable or attempt == self.MAX_RETRIES:
+                        logger.error(f"Error fetching URL {url}: {e}")
+                        break
+                    await asyncio.sleep(self.RETRY_BACKOFF * 2 ** attempt)
+            # Small jitter so requests don't arrive in lockstep
+            await asyncio.sleep(random.uniform(0, 0.05))
+        return content
 
-    def _get_assessment_details(self, url: str) -> Dict:
+    async def _get_assessment_details(self, session: aiohttp.ClientSession,
+                                      semaphore: asyncio.Semaphore, url: str) -> Dict:
         """Scrape detailed information from an assessment's page."""
+        content = await self._get_page_content(session, semaphore, url)
+        return self._parse_assessment_details(content)
+
+    def _parse_assessment_details(self, content: str) -> Dict:
+        """Extract the detail fields from an assessment page."""
         details = {
             'description': '',
             'job_levels': '',
@@ -47,74 +86,87 @@ class SHLScraper:
             'assessment_length': ''
         }
         
-        content = self._get_page_content(url)
         if not content:
             return details
             
-        soup = BeautifulSoup(content, 'html.parser')
+        tree = HTMLParser(content)
         
         # Get Description - updated to match the correct HTML structure
-        desc_div = soup.find('div', class_='product-catalogue-training-calendar__row typ')
-        if desc_div and desc_div.find('p'):
-            details['description'] = desc_div.find('p').text.strip()
+        desc_p = tree.css_first('div.product-catalogue-training-calendar__row.typ p')
+        if desc_p:
+            details['description'] = desc_p.text().strip()
+        
+        sections = self._section_paragraphs(tree)
         
         # Get Job levels
-        job_section = soup.find('h4', string='Job levels')
-        if job_section and job_section.find_next('p'):
-            details['job_levels'] = job_section.find_next('p').text.strip().rstrip(',')
+        if 'Job levels' in sections:
+            details['job_levels'] = sections['Job levels'].strip().rstrip(',')
         
         # Get Languages
-        lang_section = soup.find('h4', string='Languages')
-        if lang_section and lang_section.find_next('p'):
-            details['languages'] = lang_section.find_next('p').text.strip().rstrip(',')
+        if 'Languages' in sections:
+            details['languages'] = sections['Languages'].strip().rstrip(',')
         
         # Get Assessment length
-        length_section = soup.find('h4', string='Assessment length')
-        if length_section and length_section.find_next('p'):
-            length_text = length_section.find_next('p').text.strip()
-            # Extract number from text like "Approximate Completion Time in minutes = 49"
-            if match := re.search(r'=\s*(\d+)', length_text):
+        if 'Assessment length' in sections:
+            length_text = sections['Assessment length'].strip()
+            if match := self._LENGTH_RE.search(length_text):
                 details['assessment_length'] = match.group(1)
             else:
                 details['assessment_length'] = length_text
         
         return details
 
+    def _section_paragraphs(self, tree: HTMLParser) -> Dict[str, str]:
+        """Map each h4 heading on a page to the text of the first <p> after it."""
+        sections = {}
+        pending = []
+        # css() returns matches in document order, so each <p> closes the headings before it
+        for node in tree.css('h4, p'):
+            if node.tag == 'h4':
+                pending.append(node.text())
+            else:
+                for heading in pending:
+                    sections.setdefault(heading, node.text())
+                pending = []
+        return sections
+
     def _parse_catalog_page(self, html_content: str) -> List[Dict]:
         """Parse the HTML content and extract assessment information."""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        tree = HTMLParser(html_content)
         assessments = []
         
         # Find all rows in the table
-        rows = soup.find_all('tr')
+        rows = tree.css('tr')
         
         for row in rows:
             # Skip header rows
-            if not row.find('a'):
+            name_link = row.css_first('a')
+            if not name_link:
                 continue
                 
             assessment = {}
             
             # Get assessment name and URL
-            name_link = row.find('a')
-            if name_link:
-                assessment['name'] = name_link.text.strip()
-                assessment['url'] = f"https://www.shl.com{name_link['href']}"
+            assessment['name'] = name_link.text().strip()
+            assessment['url'] = f"https://www.shl.com{name_link.attributes['href']}"
+            
+            # Collect the row's cells once and read the columns from the list
+            cells = row.css('td')
             
             # Get Remote Testing Support
-            remote_testing = row.find_all('td')[1].find('span', class_='catalogue__circle -yes')
+            remote_testing = cells[1].css_first('span.catalogue__circle.-yes')
             assessment['remote_testing'] = 'Yes' if remote_testing else 'No'
             
             # Get Adaptive/IRT Support
-            adaptive = row.find_all('td')[2].find('span', class_='catalogue__circle -yes')
+            adaptive = cells[2].css_first('span.catalogue__circle.-yes')
             assessment['adaptive_irt'] = 'Yes' if adaptive else 'No'
             
             # Get Test Type
-            test_type_cell = row.find_all('td')[3]
-            test_type_spans = test_type_cell.find_all('span', class_='product-catalogue__key')
+            test_type_cell = cells[3]
+            test_type_spans = test_type_cell.css('span.product-catalogue__key')
             test_types = []
             for span in test_type_spans:
-                type_code = span.text.strip()
+                type_code = span.text().strip()
                 if type_code in self.test_type_map:
                     test_types.append(self.test_type_map[type_code])
             assessment['test_type'] = ', '.join(test_types)
@@ -123,52 +175,72 @@ class SHLScraper:
             
         return assessments
 
-    def scrape_all(self):
-        """Scrape all pages for both Individual Tests and Pre-packaged Solutions."""
-        all_data = []
+    async def _scrape_page(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                           type_id: int, start: int, category: str) -> List[Dict]:
+        """Scrape one catalogue page, then the detail pages of its assessments concurrently."""
+        content = await self._get_page_content(
+            session, semaphore, f"{self.base_url}?start={start}&type={type_id}&type={type_id}"
+        )
+        logger.info(f"Parsing {category} page {start//12 + 1}")
+        items = self._parse_catalog_page(content) if content else []
         
-        # Scrape first two pages of Individual Test Solutions (type=1)
-        for start in range(0, 373, 12):  # Changed from 373 to 24 to get first two pages
-            logger.info(f"Scraping Individual Tests page {start//12 + 1}")
-            content = self._get_page_content(f"{self.base_url}?start={start}&type=1&type=1")
-            if content:
-                page_data = self._parse_catalog_page(content)
-                for item in page_data:
-                    item['category'] = 'Individual Test Solutions'
-                    # Get additional details from assessment page
-                    logger.info(f"Fetching details for: {item['name']}")
-                    details = self._get_assessment_details(item['url'])
-                    item.update(details)
-                all_data.extend(page_data)
-            time.sleep(1)  # Be nice to the server
-            
-        # Scrape first two pages of Pre-packaged Job Solutions (type=2)
-        for start in range(0, 133, 12):  # Changed from 133 to 24 to get first two pages
-            logger.info(f"Scraping Pre-packaged Solutions page {start//12 + 1}")
-            content = self._get_page_content(f"{self.base_url}?start={start}&type=2&type=2")
-            if content:
-                page_data = self._parse_catalog_page(content)
-                for item in page_data:
-                    item['category'] = 'Pre-packaged Job Solutions'
-                    # Get additional details from assessment page
-                    logger.info(f"Fetching details for: {item['name']}")
-                    details = self._get_assessment_details(item['url'])
-                    item.update(details)
-                all_data.extend(page_data)
-            time.sleep(1)  # Be nice to the server
+        # Get additional details from each assessment page
+        all_details = await asyncio.gather(*(
+            self._get_assessment_details(session, semaphore, item['url']) for item in items
+        ))
+        for item, details in zip(items, all_details):
+            item['category'] = category
+            item.update(details)
+        return items
+
+    async def ascrape_all(self, parquet_path: str = 'shl_assessments.parquet',
+                          csv_path: str = 'shl_assessments.csv') -> pd.DataFrame:
+        """
+        Scrape all pages for both Individual Tests and Pre-packaged Solutions concurrently
+        
+        Every catalogue page is scraped as its own task. Finished pages are written
+        in catalogue order, one Parquet row group (zstd) and a block of CSV rows per
+        page, so rows are never accumulated in memory.
+        
+        Args:
+            parquet_path: Path of the Parquet output file
+            csv_path: Path of the CSV output file
             
-        # Convert to DataFrame and save
-        df = pd.DataFrame(all_data)
-        # Reorder columns to put the new fields in a logical order
-        columns = ['name', 'category', 'description', 'job_levels', 'languages', 
-                  'assessment_length', 'remote_testing', 'adaptive_irt', 
-                  'test_type', 'url']
-        df = df[columns]
-        df.to_csv('shl_assessments.csv', index=False)
-        logger.info(f"Scraped {len(df)} total assessments")
-        return df
+        Returns:
+            DataFrame read back from the Parquet file
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # One pooled connector so every request reuses keep-alive connections to shl.com
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+        timeout = aiohttp.ClientTimeout(total=30)
+        total = 0
+        async with aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=timeout) as session:
+            tasks = [
+                asyncio.create_task(self._scrape_page(session, semaphore, type_id, start, category))
+                for type_id, last_start, category in self.CATEGORIES
+                for start in range(0, last_start, 12)
+            ]
+            # The Parquet writer is closed last so its mtime is not older than the CSV's
+            with pq.ParquetWriter(parquet_path, self.SCHEMA, compression='zstd') as writer, \
+                    open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
+                csv_writer = csv.DictWriter(csv_file, fieldnames=self.COLUMNS, lineterminator='\n')
+                csv_writer.writeheader()
+                for task in tasks:
+                    page_data = await task
+                    if not page_data:
+                        continue
+                    writer.write_table(pa.Table.from_pylist(page_data, schema=self.SCHEMA))
+                    csv_writer.writerows(page_data)
+                    total += len(page_data)
+        
+        logger.info(f"Scraped {total} total assessments")
+        return pq.read_table(parquet_path).to_pandas()
+
+    def scrape_all(self):
+        """Scrape all pages for both Individual Tests and Pre-packaged Solutions."""
+        return asyncio.run(self.ascrape_all())
 
 if __name__ == "__main__":
     scraper = SHLScraper()
     results = scraper.scrape_all()
-    print(f"Scraped {len(results)} assessments. Results saved to shl_assessments.csv")
\ No newline at end of file
+    print(f"Scraped {len(results)} assessments. Results saved to shl_assessments.parquet and shl_assessments.csv")
\ No newline at end of file